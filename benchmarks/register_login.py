@@ -0,0 +1,72 @@
+"""Login throughput of register/app.py as the hashing pool grows.
+
+    python -m benchmarks.register_login [--users 32] [--logins 256] [--threads 32]
+
+Each round runs the app against a fresh SQLite file with a pool of 1, 2, 4,
+... workers (up to the number of cores) and fires concurrent logins through
+the Flask test client. Logins per second should grow with the pool size.
+A last round shrinks the queue bound to show requests past it getting a
+fast 503.
+"""
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def load_app(workers, max_pending, database):
+    os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database}'
+    os.environ['FLASK_PASSWORD_HASH_WORKERS'] = str(workers)
+    os.environ['FLASK_PASSWORD_HASH_MAX_PENDING'] = str(max_pending)
+    os.environ['FLASK_SECRET_KEY'] = '"benchmark"'
+    sys.modules.pop('register.app', None)
+    return importlib.import_module('register.app')
+
+
+def run_round(workers, max_pending, users, logins, threads):
+    with tempfile.TemporaryDirectory() as tmp:
+        module = load_app(workers, max_pending, os.path.join(tmp, 'bench.db'))
+        app = module.app
+        with app.app_context():
+            module.db.create_all()
+        client = app.test_client()
+        for i in range(users):
+            client.post('/register', data={'username': f'user{i}', 'password': f'secret{i}'})
+
+        def login(i):
+            response = app.test_client().post(
+                '/login', data={'username': f'user{i % users}', 'password': f'secret{i % users}'})
+            return response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            statuses = list(pool.map(login, range(logins)))
+        elapsed = time.perf_counter() - start
+        module.hasher.shutdown()
+    return statuses.count(302) / elapsed, statuses.count(503)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=32)
+    parser.add_argument('--logins', type=int, default=256)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    workers = 1
+    print('workers   logins/s   rejected (503)')
+    while workers <= (os.cpu_count() or 1):
+        rate, rejected = run_round(workers, args.threads, args.users, args.logins, args.threads)
+        print(f'{workers:>7}   {rate:>8.1f}   {rejected}')
+        workers *= 2
+
+    # Same load against a queue that only admits one job per worker
+    rate, rejected = run_round(1, 1, args.users, args.logins, args.threads)
+    print(f'saturated queue: {rate:.1f} logins/s, {rejected} fast 503s')
+
+
+if __name__ == '__main__':
+    main()
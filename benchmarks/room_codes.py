@@ -0,0 +1,61 @@
+"""Room-code allocation latency as the code table fills up.
+
+    python -m benchmarks.room_codes [--length 3]
+
+Fills the code space of one length up to 95% occupancy and reports the
+mean and worst allocation time in each 5% band, for the allocator and for
+the old rejection-sampling loop.
+"""
+import argparse
+import random
+import time
+from string import ascii_uppercase
+
+from chat.codes import RoomCodeAllocator
+
+
+def rejection_sampling(taken, length):
+    while True:
+        code = "".join(random.choice(ascii_uppercase) for _ in range(length))
+        if code not in taken:
+            return code
+
+
+def run(allocate, total, bands=19):
+    band_size = total // 20
+    results = []
+    for band in range(bands):
+        timings = []
+        for _ in range(band_size):
+            start = time.perf_counter()
+            allocate()
+            timings.append(time.perf_counter() - start)
+        results.append((band * 5, sum(timings) / len(timings), max(timings)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--length", type=int, default=3)
+    args = parser.parse_args()
+    total = len(ascii_uppercase) ** args.length
+
+    allocator = RoomCodeAllocator(args.length, max_occupancy=1.0, rng=random.Random(0))
+    taken = set()
+
+    def old():
+        taken.add(rejection_sampling(taken, args.length))
+
+    random.seed(0)
+    new_results = run(allocator.allocate, total)
+    old_results = run(old, total)
+
+    print(f"{total} codes of length {args.length}")
+    print("occupancy   allocator mean/max (us)   rejection mean/max (us)")
+    for (band, mean, worst), (_, old_mean, old_worst) in zip(new_results, old_results):
+        print(f"{band:>3}-{band + 5:<3}%   {mean * 1e6:>8.2f} / {worst * 1e6:<10.2f}"
+              f"   {old_mean * 1e6:>8.2f} / {old_worst * 1e6:.2f}")
+
+
+if __name__ == "__main__":
+    main()
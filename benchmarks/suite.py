@@ -0,0 +1,447 @@
+"""Load tests for the chat, tutor booking, register and slot apps.
+
+    python -m benchmarks.suite [--scales 1000,100000] [--only tutors,slots] [--rounds 3]
+                               [--requests 200] [--tolerance 0.5] [--update-baselines]
+
+Each scenario loads the real app against a fresh SQLite file in a temporary
+directory, seeds it with ``scale`` rows from a fixed random seed, and drives
+it through the Flask test client (and the Flask-SocketIO test client for the
+chat). Every operation reports its throughput, p50/p99 latency and, when it
+runs on a single thread, the SQL statements issued per request; each
+scenario runs ``--rounds`` times and the median is kept. Contended
+bookings are checked for double bookings.
+
+Results are compared with benchmarks/baselines.json, keyed by operation and
+scale. The run fails when an operation's throughput or p50 is more than
+``--tolerance`` worse than its baseline (p99 gets four times that), or when a
+request issues more statements than it used to. Baselines depend on the
+machine, so record them with ``--update-baselines`` on the machine that
+runs the comparison.
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, select
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+SEED = 0
+# Latency changes smaller than this are noise, whatever the ratio
+LATENCY_SLACK_MS = 1.0
+WARMUP = 20
+
+FIRST_NAMES = ['Aina', 'Arjun', 'Chen', 'Daniel', 'Farah', 'Hafiz', 'Jia', 'Kavitha', 'Lim', 'Mei',
+               'Nur', 'Priya', 'Raj', 'Ruben', 'Siti', 'Tan', 'Wei', 'Yusuf', 'Zara', 'Amir']
+LAST_NAMES = ['Abdullah', 'Chong', 'Devi', 'Hassan', 'Ismail', 'Kumar', 'Lee', 'Ng', 'Ong', 'Rahman',
+              'Raj', 'Singh', 'Tan', 'Wong', 'Yap', 'Zainal', 'Goh', 'Lau', 'Menon', 'Pillai']
+SUBJECTS = ['Mathematics', 'Physics', 'Chemistry', 'Biology', 'English', 'Malay', 'History',
+            'Accounting', 'Economics', 'Programming', 'Statistics', 'Calculus', 'Databases',
+            'Networking', 'Multimedia']
+WORDS = ['hello', 'anyone', 'here', 'lecture', 'notes', 'tomorrow', 'assignment', 'due', 'thanks',
+         'see', 'you', 'at', 'the', 'library', 'lab', 'quiz', 'room', 'group', 'project', 'done']
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def check(condition, message):
+    if not condition:
+        raise BenchmarkError(message)
+
+
+def expect(response, *statuses):
+    check(response.status_code in statuses,
+          f'{response.request.method} {response.request.path} returned {response.status_code}')
+    return response
+
+
+@contextlib.contextmanager
+def environment(values):
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def load_app(name, env):
+    """Import a fresh copy of the app module ``name`` with ``env`` set."""
+    sys.modules.pop(name, None)
+    with environment(env):
+        return importlib.import_module(name)
+
+
+def sqlite_env(path, **extra):
+    env = {'FLASK_SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'}
+    env.update({f'FLASK_{name}': json.dumps(value) for name, value in extra.items()})
+    return env
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(name, op, count, threads=1, engine=None, warmup=0):
+    """Call ``op(i)`` for i in range(count) on ``threads`` threads and
+    summarise the latencies. Statements are counted on ``engine`` when
+    running on a single thread. Read-only operations can first be called
+    ``warmup`` times untimed, to fill SQLite's page cache and Jinja's
+    template cache."""
+    for i in range(warmup):
+        op(i)
+    latencies = []
+    statements = [0]
+
+    def timed(i):
+        start = time.perf_counter()
+        op(i)
+        latencies.append(time.perf_counter() - start)
+
+    def count_statement(*args):
+        statements[0] += 1
+
+    counting = engine is not None and threads == 1
+    if counting:
+        event.listen(engine, 'before_cursor_execute', count_statement)
+    start = time.perf_counter()
+    try:
+        if threads == 1:
+            for i in range(count):
+                timed(i)
+        else:
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(timed, range(count)))
+    finally:
+        if counting:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'name': name,
+        'ops': count,
+        'throughput': round(count / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'statements': round(statements[0] / count, 2) if counting else None,
+    }
+
+
+def bench_chat(scale, args, tmp):
+    module = load_app('main', {'CHAT_STORE_URL': 'memory://',
+                                     'CHAT_LOG_PATH': os.path.join(tmp, 'chat_log.db')})
+    app, socketio, rooms = module.app, module.socketio, module.rooms
+    logging.getLogger('chat').setLevel(logging.WARNING)
+    # Keep the reaper away from the seeded rooms while the benchmark runs
+    app.config.update(CHAT_ROOM_IDLE_TTL=10 ** 9, CHAT_EMPTY_ROOM_TTL=10 ** 9, CHAT_MEMORY_BUDGET=2 ** 62)
+    rng = random.Random(SEED)
+
+    # Seeded rows are history messages, up to 100 per room
+    per_room = min(scale, 100)
+    codes = []
+    for _ in range(scale // per_room):
+        code = module.room_codes.allocate()
+        rooms.create_room(code)
+        for i in range(per_room):
+            rooms.append_message(code, {'name': f'user{i % 10}', 'time': time.time(),
+                                        'message': ' '.join(rng.choices(WORDS, k=8))})
+        codes.append(code)
+
+    def join(name, code, action='join'):
+        client = app.test_client()
+        expect(client.post('/', data={'name': name, 'code': code, action: action}), 302)
+        sio = socketio.test_client(app, flask_test_client=client)
+        check(sio.is_connected(), f'{name} could not connect to room {code}')
+        return client, sio
+
+    results = []
+
+    def create_room(i):
+        expect(app.test_client().post('/', data={'name': f'creator{i}', 'create': 'create'}), 302)
+
+    results.append(measure('chat.create_room', create_room, args.requests))
+
+    members = []
+    results.append(measure('chat.join', lambda i: members.append(join(f'member{i}', rng.choice(codes))),
+                           args.requests))
+    reader = members[0][0]
+
+    def history(i):
+        expect(reader.get(f'/room/history?before={rng.randint(1, per_room)}'), 200)
+
+    results.append(measure('chat.history', history, args.requests, warmup=WARMUP))
+    for _, sio in members:
+        sio.disconnect()
+
+    # One sender and --fanout listeners in a fresh room; each message is
+    # delivered to every listener before emit() returns
+    sender_client, sender = join('sender', '', 'create')
+    with sender_client.session_transaction() as session:
+        code = session['room']
+    listeners = [join(f'listener{i}', code)[1] for i in range(args.fanout)]
+    for sio in [sender] + listeners:
+        sio.get_received()
+
+    results.append(measure(f'chat.broadcast_{args.fanout}', lambda i: sender.emit('message', {'data': f'm{i}'}),
+                           args.requests))
+    for sio in listeners:
+        received = [packet for packet in sio.get_received() if packet['name'] == 'message']
+        check(len(received) == args.requests,
+              f'a listener received {len(received)} of {args.requests} broadcasts')
+    for sio in [sender] + listeners:
+        sio.disconnect()
+    module.message_log.close()
+    return results
+
+
+def bench_tutors(scale, args, tmp):
+    module = load_app('tutor_booking.app',
+                      sqlite_env(os.path.join(tmp, 'tutors.db'), WTF_CSRF_ENABLED=False))
+    app, db, client = module.app, module.db, module.app.test_client()
+    rng = random.Random(SEED)
+
+    # Seeded rows are tutors, each with two free slots
+    with app.app_context():
+        module.init_db()
+        with db.engine.begin() as conn:
+            conn.execute(module.Tutor.__table__.insert(), [
+                {'id': i, 'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                 'phone': f'01{i:08d}', 'subject': rng.choice(SUBJECTS)}
+                for i in range(1, scale + 1)])
+            conn.execute(module.TutorSlot.__table__.insert(), [
+                {'tutor_id': i, 'start': start}
+                for i in range(1, scale + 1) for start in ('Mon 10:00', 'Wed 14:00')])
+        engine = db.engine
+
+    results = []
+
+    def cold(url, status=200):
+        # Measure the views themselves, not the page cache
+        module.page_cache.clear()
+        expect(client.get(url), status)
+
+    results.append(measure('tutors.list', lambda i: cold(f'/?after={rng.randint(0, scale)}'),
+                           args.requests, engine=engine, warmup=WARMUP))
+    results.append(measure('tutors.search', lambda i: cold(f'/?search={rng.choice(SUBJECTS + FIRST_NAMES)}'),
+                           args.requests, engine=engine, warmup=WARMUP))
+    results.append(measure('tutors.suggest', lambda i: cold(f'/search/suggest?q={rng.choice(FIRST_NAMES)[:3]}'),
+                           args.requests, engine=engine, warmup=WARMUP))
+    results.append(measure('tutors.info', lambda i: cold(f'/tutor/{rng.randint(1, scale)}'),
+                           args.requests, engine=engine, warmup=WARMUP))
+
+    # --threads students race for each slot; exactly one of them may get it
+    contended = max(1, min(scale, args.requests // args.threads))
+
+    def book(i):
+        tutor_id = i // args.threads + 1
+        response = app.test_client().post(f'/book/{tutor_id}', data={
+            'student_name': f'student{i}', 'slot': 'Mon 10:00'})
+        expect(response, 200, 302)
+
+    results.append(measure(f'tutors.book_contended_{args.threads}', book, contended * args.threads,
+                           threads=args.threads))
+    with app.app_context():
+        bookings = db.session.execute(
+            select(module.Booking.tutor_id, func.count()).group_by(module.Booking.tutor_id)).all()
+        booked = db.session.scalar(
+            select(func.count()).select_from(module.TutorSlot).where(module.TutorSlot.booking_id.isnot(None)))
+    check(all(count == 1 for _, count in bookings), 'a tutor slot was booked more than once')
+    check(len(bookings) == contended and booked == contended,
+          f'{len(bookings)} bookings and {booked} booked slots for {contended} contended slots')
+
+    results.append(measure('tutors.bookings', lambda i: expect(client.get('/bookings'), 200),
+                           args.requests, engine=engine, warmup=WARMUP))
+    return results
+
+
+def bench_register(scale, args, tmp):
+    # Queue every concurrent login instead of shedding the excess with a 503
+    module = load_app('register.app',
+                      sqlite_env(os.path.join(tmp, 'register.db'), SECRET_KEY='benchmark',
+                                 PASSWORD_HASH_MAX_PENDING=args.threads))
+    app, db = module.app, module.db
+    rng = random.Random(SEED)
+
+    # Seeded rows are users; they share one hash since hashing a million
+    # passwords would take hours
+    password = module.hasher.hash('secret')
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as conn:
+            conn.execute(module.User.__table__.insert(),
+                         [{'username': f'user{i}', 'password': password} for i in range(scale)])
+
+    results = []
+    try:
+        def login(i):
+            response = app.test_client().post(
+                '/login', data={'username': f'user{rng.randrange(scale)}', 'password': 'secret'})
+            check(expect(response, 302).location.endswith('/'), 'login was rejected')
+
+        results.append(measure(f'register.login_{args.threads}', login, args.logins, threads=args.threads))
+
+        def register(i):
+            response = app.test_client().post(
+                '/register', data={'username': f'new{i}', 'password': 'secret'})
+            expect(response, 302)
+
+        results.append(measure(f'register.register_{args.threads}', register, args.logins,
+                               threads=args.threads))
+        with app.app_context():
+            created = db.session.scalar(
+                select(func.count()).select_from(module.User).where(module.User.username.like('new%')))
+        check(created == args.logins, f'{created} of {args.logins} registrations were stored')
+    finally:
+        module.hasher.shutdown()
+    return results
+
+
+def bench_slots(scale, args, tmp):
+    module = load_app('your_project.app', sqlite_env(os.path.join(tmp, 'slots.db')))
+    app, db, client = module.app, module.db, module.app.test_client()
+    rng = random.Random(SEED)
+
+    # Seeded rows are half-hourly slots, every third one booked
+    first = datetime(2025, 1, 6)
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(module.Slot.__table__.insert(), [
+                {'time': first + timedelta(minutes=30 * i), 'status': 'Booked' if i % 3 == 0 else None}
+                for i in range(scale)])
+        engine = db.engine
+    days = max(1, scale // 48)
+
+    def day():
+        return (first + timedelta(days=rng.randrange(days))).date()
+
+    def api_day(i):
+        start = day()
+        expect(client.get(f'/api/slots?from={start}&to={start + timedelta(days=1)}'), 200)
+
+    results = [
+        measure('slots.api_day', api_day, args.requests, engine=engine, warmup=WARMUP),
+        measure('slots.index_week', lambda i: expect(client.get(f'/?start={day()}&days=7'), 200),
+                args.requests, engine=engine, warmup=WARMUP),
+    ]
+
+    # --threads requests race for each free slot
+    with app.app_context():
+        free = db.session.scalars(select(module.Slot.id).where(module.Slot.status.is_(None))
+                                  .order_by(module.Slot.id).limit(max(1, args.requests // args.threads))).all()
+
+    def book(i):
+        expect(app.test_client().post(f'/book/{free[i // args.threads]}'), 302)
+
+    results.append(measure(f'slots.book_contended_{args.threads}', book, len(free) * args.threads,
+                           threads=args.threads))
+    with app.app_context():
+        booked = db.session.scalar(select(func.count()).select_from(module.Slot)
+                                   .where(module.Slot.id.in_(free), module.Slot.status == 'Booked'))
+        total = db.session.scalar(select(func.count()).select_from(module.Slot))
+    check(booked == len(free), f'{booked} of {len(free)} contended slots ended up booked')
+    check(total == scale, f'{total} slots after booking, expected {scale}')
+    return results
+
+
+SCENARIOS = {
+    'chat': bench_chat,
+    'tutors': bench_tutors,
+    'register': bench_register,
+    'slots': bench_slots,
+}
+
+
+def median_result(results):
+    """Combine the results of one operation over several rounds."""
+    combined = dict(results[0])
+    for key in ('throughput', 'p50_ms', 'p99_ms'):
+        combined[key] = statistics.median(result[key] for result in results)
+    if combined['statements'] is not None:
+        combined['statements'] = max(result['statements'] for result in results)
+    return combined
+
+
+def compare(result, baseline, tolerance):
+    """Return the ways ``result`` is worse than ``baseline``."""
+    problems = []
+    if result['throughput'] < baseline['throughput'] / (1 + tolerance):
+        problems.append(f"throughput {result['throughput']}/s < {baseline['throughput']}/s")
+    for key, allowed in (('p50_ms', tolerance), ('p99_ms', 4 * tolerance)):
+        limit = max(baseline[key] * (1 + allowed), baseline[key] + LATENCY_SLACK_MS)
+        if result[key] > limit:
+            problems.append(f'{key} {result[key]} > {baseline[key]}')
+    if result['statements'] is not None and baseline.get('statements') is not None \
+            and result['statements'] > baseline['statements']:
+        problems.append(f"statements {result['statements']} > {baseline['statements']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default='1000', help='comma-separated seeded row counts')
+    parser.add_argument('--only', default=','.join(SCENARIOS), help='comma-separated scenarios')
+    parser.add_argument('--requests', type=int, default=200, help='requests per operation')
+    parser.add_argument('--logins', type=int, default=32, help='logins and registrations (each hashes)')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent clients in contended operations')
+    parser.add_argument('--fanout', type=int, default=50, help='listeners per broadcast')
+    parser.add_argument('--rounds', type=int, default=3, help='runs per scenario; the median is reported')
+    parser.add_argument('--tolerance', type=float, default=0.5)
+    parser.add_argument('--update-baselines', action='store_true')
+    args = parser.parse_args()
+    # Contended writes are slow on purpose; the table below is the report
+    logging.getLogger('metrics.slow_query').setLevel(logging.ERROR)
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+
+    regressions = 0
+    print(f"{'operation':<30} {'scale':>8} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'stmts':>6}  baseline")
+    for scale in [int(s) for s in args.scales.split(',')]:
+        for scenario in args.only.split(','):
+            rounds = []
+            for _ in range(args.rounds):
+                with tempfile.TemporaryDirectory() as tmp:
+                    rounds.append(SCENARIOS[scenario](scale, args, tmp))
+            for result in map(median_result, zip(*rounds)):
+                key = f"{result['name']}@{scale}"
+                if args.update_baselines:
+                    baselines[key] = {k: v for k, v in result.items() if k != 'name'}
+                    verdict = 'updated'
+                elif key not in baselines:
+                    verdict = 'none recorded'
+                else:
+                    problems = compare(result, baselines[key], args.tolerance)
+                    regressions += bool(problems)
+                    verdict = 'REGRESSION: ' + '; '.join(problems) if problems else 'ok'
+                statements = '' if result['statements'] is None else result['statements']
+                print(f"{result['name']:<30} {scale:>8} {result['throughput']:>9} {result['p50_ms']:>9} "
+                      f"{result['p99_ms']:>9} {statements:>6}  {verdict}")
+
+    if args.update_baselines:
+        with open(BASELINES, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if regressions:
+        sys.exit(f'{regressions} operation(s) regressed against {os.path.relpath(BASELINES)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import random
+import threading
+from string import ascii_uppercase
+
+
+class _CodePool:
+    """Every code of one length that is not handed out, as a lazily shuffled
+    range of integers (sparse Fisher-Yates): drawing or returning a code is
+    O(1) and memory grows only with the number of codes handed out."""
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.remaining = size
+        self._swaps = {}
+        self._rng = rng
+
+    def draw(self):
+        i = self._rng.randrange(self.remaining)
+        self.remaining -= 1
+        last = self.remaining
+        value = self._swaps.pop(i, i)
+        if i != last:
+            self._swaps[i] = self._swaps.pop(last, last)
+        return value
+
+    def put(self, value):
+        if value != self.remaining:
+            self._swaps[self.remaining] = value
+        self.remaining += 1
+
+
+class RoomCodeAllocator:
+    """Hands out unused room codes in constant time.
+
+    Codes are drawn at random without replacement from the pool of the
+    current length and go back into it on ``release``. Once the share of codes
+    in use reaches ``max_occupancy`` the allocator moves on to codes one
+    character longer, so allocation never has to retry against a nearly full
+    code space.
+    """
+
+    def __init__(self, length=4, max_occupancy=0.9, alphabet=ascii_uppercase, rng=None):
+        self.length = length
+        self.max_occupancy = max_occupancy
+        self.alphabet = alphabet
+        self._rng = rng or random.SystemRandom()
+        self._pools = {}
+        self._in_use = {}
+        # Codes drawn from a pool, and reserved codes that are still in one
+        self._drawn = set()
+        self._reserved = set()
+        self._lock = threading.Lock()
+
+    def _pool(self, length):
+        if length not in self._pools:
+            self._pools[length] = _CodePool(len(self.alphabet) ** length, self._rng)
+            self._in_use[length] = 0
+        return self._pools[length]
+
+    def occupancy(self, length=None):
+        length = length or self.length
+        pool = self._pool(length)
+        return self._in_use[length] / pool.size
+
+    def allocate(self):
+        with self._lock:
+            while True:
+                pool = self._pool(self.length)
+                if self._in_use[self.length] >= pool.size * self.max_occupancy or not pool.remaining:
+                    self.length += 1
+                    continue
+                code = self._encode(pool.draw(), self.length)
+                if code in self._reserved:
+                    # Already taken through reserve(); it is out of the pool now
+                    self._reserved.discard(code)
+                    self._drawn.add(code)
+                    continue
+                self._drawn.add(code)
+                self._in_use[self.length] += 1
+                return code
+
+    def reserve(self, code):
+        """Mark a code that was not handed out by ``allocate`` as in use, such
+        as a room restored from the message log."""
+        with self._lock:
+            if code in self._reserved or code in self._drawn or not self._valid(code):
+                return
+            self._pool(len(code))
+            self._reserved.add(code)
+            self._in_use[len(code)] += 1
+
+    def release(self, code):
+        """Return a code to the pool. Codes this allocator did not hand out
+        or reserve (such as one allocated by another worker) are ignored."""
+        with self._lock:
+            if code in self._drawn:
+                self._drawn.discard(code)
+                self._pools[len(code)].put(self._decode(code))
+            elif code in self._reserved:
+                # Never left the pool, so there is nothing to put back
+                self._reserved.discard(code)
+            else:
+                return
+            self._in_use[len(code)] -= 1
+
+    def _valid(self, code):
+        return bool(code) and all(char in self.alphabet for char in code)
+
+    def _encode(self, value, length):
+        base = len(self.alphabet)
+        chars = []
+        for _ in range(length):
+            value, digit = divmod(value, base)
+            chars.append(self.alphabet[digit])
+        return "".join(reversed(chars))
+
+    def _decode(self, code):
+        base = len(self.alphabet)
+        value = 0
+        for char in code:
+            value = value * base + self.alphabet.index(char)
+        return value
@@ -0,0 +1,72 @@
+from collections import deque
+
+
+def message_size(message):
+    """Rough number of bytes a stored message keeps alive."""
+    return 100 + len(str(message.get("name", ""))) + len(str(message.get("message", "")))
+
+
+class MessageHistory:
+    """Fixed-capacity ring buffer holding the most recent messages of a room.
+
+    Every message is stamped with a sequence number that keeps increasing for
+    the lifetime of the room, so clients can page backwards with a ``before``
+    cursor even after older entries have been dropped from the buffer.
+    """
+
+    def __init__(self, capacity=500):
+        self.capacity = capacity
+        self._messages = deque(maxlen=capacity)
+        self._next_seq = 1
+        self.size_bytes = 0
+
+    def __len__(self):
+        return len(self._messages)
+
+    @property
+    def first_seq(self):
+        if not self._messages:
+            return self._next_seq
+        return self._messages[0]["seq"]
+
+    def append(self, message):
+        entry = dict(message, seq=self._next_seq)
+        self._next_seq += 1
+        if len(self._messages) == self.capacity:
+            self.size_bytes -= message_size(self._messages[0])
+        self._messages.append(entry)
+        self.size_bytes += message_size(entry)
+        return entry
+
+    def restore(self, messages):
+        """Refill the buffer with already-numbered messages, oldest first."""
+        self._messages.clear()
+        self._messages.extend(messages)
+        if self._messages:
+            self._next_seq = self._messages[-1]["seq"] + 1
+        self.size_bytes = sum(message_size(m) for m in self._messages)
+
+    def trim(self, keep):
+        """Drop all but the newest ``keep`` messages, returning bytes freed."""
+        freed = 0
+        while len(self._messages) > keep:
+            freed += message_size(self._messages.popleft())
+        self.size_bytes -= freed
+        return freed
+
+    def page(self, before=None, limit=50):
+        """Return ``(messages, cursor)`` for up to ``limit`` messages older
+        than ``before`` (newest page when ``before`` is None), oldest first.
+
+        ``cursor`` is the value to pass as ``before`` for the next older page,
+        or None once the start of the retained history is reached.
+        """
+        if limit <= 0:
+            return [], None
+        end = len(self._messages)
+        if before is not None:
+            end = max(0, min(end, before - self.first_seq))
+        start = max(0, end - limit)
+        messages = [self._messages[i] for i in range(start, end)]
+        cursor = messages[0]["seq"] if start > 0 else None
+        return messages, cursor
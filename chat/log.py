@@ -0,0 +1,140 @@
+import atexit
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+_DROP = object()
+
+
+class MessageLog:
+    """Append-only log of every room's messages, persisted off the hot path.
+
+    ``append`` only puts the entry on a queue. A background thread drains it
+    and writes a batch in one transaction as soon as ``batch_size`` entries are
+    waiting or ``flush_ms`` milliseconds have passed since the first of them,
+    so broadcasting a message never waits on the disk.
+    """
+
+    def __init__(self, path, batch_size=100, flush_ms=50):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self._queue = queue.SimpleQueue()
+        self._stopped = threading.Event()
+
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chat_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                room TEXT NOT NULL,
+                payload TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_chat_log_room_id ON chat_log (room, id);
+        """)
+        conn.close()
+
+        self._thread = threading.Thread(target=self._run, name="chat-message-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def append(self, room, entry):
+        self._queue.put((room, entry))
+
+    def drop(self, room):
+        """Forget a room's logged history once the room itself is gone."""
+        self._queue.put((room, _DROP))
+
+    def recent(self, room, limit):
+        """Return the last ``limit`` logged messages of a room, oldest first.
+
+        Entries still waiting in the queue are not included.
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT payload FROM chat_log WHERE room = ? ORDER BY id DESC LIMIT ?",
+                (room, limit)).fetchall()
+        finally:
+            conn.close()
+        return [json.loads(payload) for payload, in reversed(rows)]
+
+    def flush(self):
+        """Block until everything appended so far has been written."""
+        done = threading.Event()
+        self._queue.put((None, done))
+        done.wait()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put((None, self._stopped))
+            self._thread.join()
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_ms / 1000
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write(conn, batch)
+
+            waiters = [entry for room, entry in batch if isinstance(entry, threading.Event)]
+            for waiter in waiters:
+                waiter.set()
+            if self._stopped.is_set():
+                conn.close()
+                return
+
+    def _write(self, conn, batch):
+        rows = []
+        conn.execute("BEGIN")
+        try:
+            for room, entry in batch:
+                if entry is _DROP:
+                    # Keep ordering: rows for the room queued before the drop go too
+                    self._insert(conn, rows)
+                    rows = []
+                    conn.execute("DELETE FROM chat_log WHERE room = ?", (room,))
+                elif isinstance(entry, dict):
+                    rows.append((room, json.dumps(entry)))
+            self._insert(conn, rows)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            logging.getLogger(__name__).exception("Failed to write %d chat log entries", len(rows))
+
+    def _insert(self, conn, rows):
+        if rows:
+            conn.executemany("INSERT INTO chat_log (room, payload) VALUES (?, ?)", rows)
+
+
+def configure_async_logging(logger, level=logging.INFO):
+    """Send ``logger`` records through a queue to a listener thread, so
+    emitting a log line never blocks on stdout."""
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s level=%(levelname)s logger=%(name)s %(message)s"))
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+    return listener
@@ -0,0 +1,69 @@
+import sqlite3
+import time
+
+from socketio import PubSubManager
+
+
+class SQLiteManager(PubSubManager):
+    """Socket.IO client manager that relays events between processes through
+    a SQLite table.
+
+    It is a local stand-in for a Redis or RabbitMQ message queue: every worker
+    appends the events it emits to ``socketio_event`` and polls the table for
+    events written by the others, so a broadcast to a room reaches members
+    connected to any worker on the same machine.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, channel="socketio", write_only=False, logger=None,
+                 json=None, poll_interval=0.02, retention=60):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._publisher = self._connect()
+        self._publisher.execute("""
+            CREATE TABLE IF NOT EXISTS socketio_event (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                created REAL NOT NULL,
+                payload TEXT NOT NULL
+            )
+        """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _publish(self, data):
+        self._publisher.execute(
+            "INSERT INTO socketio_event (channel, created, payload) VALUES (?, ?, ?)",
+            (self.channel, time.time(), self.json.dumps(data)))
+
+    def _listen(self):
+        conn = self._connect()
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM socketio_event").fetchone()[0]
+        last_prune = time.time()
+        while True:
+            rows = conn.execute(
+                "SELECT id, payload FROM socketio_event WHERE id > ? AND channel = ? ORDER BY id",
+                (last_id, self.channel)).fetchall()
+            for last_id, payload in rows:
+                yield payload
+            if time.time() - last_prune > self.retention:
+                last_prune = time.time()
+                conn.execute("DELETE FROM socketio_event WHERE created < ?",
+                             (last_prune - self.retention,))
+            self.server.sleep(self.poll_interval)
+
+
+def create_client_manager(url):
+    """Return the cross-process client manager matching a chat store URL,
+    or None when the default single-process manager is enough."""
+    if url.startswith("sqlite:///"):
+        return SQLiteManager(url[len("sqlite:///"):])
+    return None
@@ -0,0 +1,348 @@
+import json
+import sqlite3
+import threading
+import time
+
+from chat.history import MessageHistory, message_size
+
+
+class RoomStore:
+    """Where chat room state lives.
+
+    The chat views only talk to this interface, so the same code runs against
+    a single in-process dict or against state shared by several worker
+    processes. ``code in store`` tells whether a room exists.
+    """
+
+    def create_room(self, code):
+        """Create an empty room, returning False if ``code`` is already taken."""
+        raise NotImplementedError
+
+    def load_room(self, code, messages):
+        """Create a room pre-filled with numbered ``messages`` (oldest first),
+        returning False if it already exists."""
+        raise NotImplementedError
+
+    def delete_room(self, code):
+        raise NotImplementedError
+
+    def join(self, code):
+        """Add a member and return the new member count (None if no room)."""
+        raise NotImplementedError
+
+    def leave(self, code):
+        """Remove a member, deleting the room once it is empty, and return
+        the remaining member count (None if no room)."""
+        raise NotImplementedError
+
+    def member_count(self, code):
+        raise NotImplementedError
+
+    def append_message(self, code, message):
+        """Store ``message`` and return it stamped with its sequence number."""
+        raise NotImplementedError
+
+    def history(self, code, before=None, limit=50):
+        """Return ``(messages, cursor)`` as described in MessageHistory.page."""
+        raise NotImplementedError
+
+    def codes(self):
+        raise NotImplementedError
+
+    def idle_rooms(self, idle_since, empty_since):
+        """Codes of rooms with no activity since ``idle_since``, plus rooms
+        without members and no activity since ``empty_since``."""
+        raise NotImplementedError
+
+    def rooms_by_activity(self):
+        """``(code, members, message_bytes)`` for every room, least recently
+        active first."""
+        raise NotImplementedError
+
+    def trim_history(self, code, keep):
+        """Keep only the newest ``keep`` messages, returning the bytes freed."""
+        raise NotImplementedError
+
+    def stats(self):
+        """Live counters: number of rooms, members and retained message bytes."""
+        raise NotImplementedError
+
+    def __contains__(self, code):
+        raise NotImplementedError
+
+
+class MemoryRoomStore(RoomStore):
+    """Rooms kept in a dict; only usable by a single process."""
+
+    def __init__(self, capacity=500):
+        self.capacity = capacity
+        self._rooms = {}
+        self._lock = threading.Lock()
+
+    def create_room(self, code):
+        with self._lock:
+            if code in self._rooms:
+                return False
+            self._rooms[code] = {"members": 0, "messages": MessageHistory(self.capacity),
+                                 "last_active": time.time()}
+            return True
+
+    def load_room(self, code, messages):
+        with self._lock:
+            if code in self._rooms:
+                return False
+            history = MessageHistory(self.capacity)
+            history.restore(messages)
+            self._rooms[code] = {"members": 0, "messages": history, "last_active": time.time()}
+            return True
+
+    def delete_room(self, code):
+        with self._lock:
+            self._rooms.pop(code, None)
+
+    def join(self, code):
+        with self._lock:
+            room = self._rooms.get(code)
+            if room is None:
+                return None
+            room["members"] += 1
+            room["last_active"] = time.time()
+            return room["members"]
+
+    def leave(self, code):
+        with self._lock:
+            room = self._rooms.get(code)
+            if room is None:
+                return None
+            room["members"] -= 1
+            room["last_active"] = time.time()
+            if room["members"] <= 0:
+                del self._rooms[code]
+            return max(room["members"], 0)
+
+    def member_count(self, code):
+        room = self._rooms.get(code)
+        return room["members"] if room else 0
+
+    def append_message(self, code, message):
+        with self._lock:
+            room = self._rooms.get(code)
+            if room is None:
+                return None
+            room["last_active"] = time.time()
+            return room["messages"].append(message)
+
+    def history(self, code, before=None, limit=50):
+        room = self._rooms.get(code)
+        if room is None:
+            return [], None
+        with self._lock:
+            return room["messages"].page(before, limit)
+
+    def codes(self):
+        return list(self._rooms)
+
+    def idle_rooms(self, idle_since, empty_since):
+        with self._lock:
+            return [code for code, room in self._rooms.items()
+                    if room["last_active"] < idle_since
+                    or (room["members"] <= 0 and room["last_active"] < empty_since)]
+
+    def rooms_by_activity(self):
+        with self._lock:
+            ordered = sorted(self._rooms.items(), key=lambda item: item[1]["last_active"])
+            return [(code, room["members"], room["messages"].size_bytes) for code, room in ordered]
+
+    def trim_history(self, code, keep):
+        with self._lock:
+            room = self._rooms.get(code)
+            return room["messages"].trim(keep) if room else 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rooms": len(self._rooms),
+                "members": sum(room["members"] for room in self._rooms.values()),
+                "message_bytes": sum(room["messages"].size_bytes for room in self._rooms.values()),
+            }
+
+    def __contains__(self, code):
+        return code in self._rooms
+
+
+class SQLiteRoomStore(RoomStore):
+    """Rooms kept in a SQLite database that several processes share.
+
+    Each thread gets its own connection. Writes take the database lock up
+    front (``BEGIN IMMEDIATE``) so member counts and sequence numbers stay
+    consistent across processes, and history is trimmed to ``capacity``
+    messages per room as it is appended.
+    """
+
+    def __init__(self, path, capacity=500):
+        self.path = path
+        self.capacity = capacity
+        self._local = threading.local()
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS room (
+                code TEXT PRIMARY KEY,
+                members INTEGER NOT NULL DEFAULT 0,
+                last_seq INTEGER NOT NULL DEFAULT 0,
+                last_active REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS ix_room_last_active ON room (last_active);
+            CREATE TABLE IF NOT EXISTS room_message (
+                room TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (room, seq)
+            ) WITHOUT ROWID;
+        """)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        return _Transaction(self._connection())
+
+    def create_room(self, code):
+        with self._write() as conn:
+            cur = conn.execute("INSERT OR IGNORE INTO room (code, last_active) VALUES (?, ?)",
+                               (code, time.time()))
+            return cur.rowcount == 1
+
+    def load_room(self, code, messages):
+        messages = messages[-self.capacity:]
+        last_seq = messages[-1]["seq"] if messages else 0
+        with self._write() as conn:
+            cur = conn.execute("INSERT OR IGNORE INTO room (code, last_seq, last_active) VALUES (?, ?, ?)",
+                               (code, last_seq, time.time()))
+            if cur.rowcount != 1:
+                return False
+            conn.executemany(
+                "INSERT INTO room_message (room, seq, payload, size) VALUES (?, ?, ?, ?)",
+                [(code, m["seq"], json.dumps(m), message_size(m)) for m in messages])
+            return True
+
+    def delete_room(self, code):
+        with self._write() as conn:
+            conn.execute("DELETE FROM room_message WHERE room = ?", (code,))
+            conn.execute("DELETE FROM room WHERE code = ?", (code,))
+
+    def join(self, code):
+        with self._write() as conn:
+            row = conn.execute(
+                "UPDATE room SET members = members + 1, last_active = ? WHERE code = ? RETURNING members",
+                (time.time(), code)).fetchone()
+            return row[0] if row else None
+
+    def leave(self, code):
+        with self._write() as conn:
+            row = conn.execute(
+                "UPDATE room SET members = members - 1, last_active = ? WHERE code = ? RETURNING members",
+                (time.time(), code)).fetchone()
+            if row is None:
+                return None
+            if row[0] <= 0:
+                conn.execute("DELETE FROM room_message WHERE room = ?", (code,))
+                conn.execute("DELETE FROM room WHERE code = ?", (code,))
+            return max(row[0], 0)
+
+    def member_count(self, code):
+        row = self._connection().execute(
+            "SELECT members FROM room WHERE code = ?", (code,)).fetchone()
+        return row[0] if row else 0
+
+    def append_message(self, code, message):
+        with self._write() as conn:
+            row = conn.execute(
+                "UPDATE room SET last_seq = last_seq + 1, last_active = ? WHERE code = ? RETURNING last_seq",
+                (time.time(), code)).fetchone()
+            if row is None:
+                return None
+            entry = dict(message, seq=row[0])
+            conn.execute("INSERT INTO room_message (room, seq, payload, size) VALUES (?, ?, ?, ?)",
+                         (code, entry["seq"], json.dumps(entry), message_size(entry)))
+            conn.execute("DELETE FROM room_message WHERE room = ? AND seq <= ?",
+                         (code, entry["seq"] - self.capacity))
+            return entry
+
+    def history(self, code, before=None, limit=50):
+        if limit <= 0:
+            return [], None
+        query = "SELECT payload FROM room_message WHERE room = ?"
+        params = [code]
+        if before is not None:
+            query += " AND seq < ?"
+            params.append(before)
+        query += " ORDER BY seq DESC LIMIT ?"
+        params.append(limit + 1)
+        rows = self._connection().execute(query, params).fetchall()
+        messages = [json.loads(payload) for payload, in reversed(rows[:limit])]
+        cursor = messages[0]["seq"] if len(rows) > limit else None
+        return messages, cursor
+
+    def codes(self):
+        return [code for code, in self._connection().execute("SELECT code FROM room")]
+
+    def idle_rooms(self, idle_since, empty_since):
+        rows = self._connection().execute(
+            "SELECT code FROM room WHERE last_active < ? OR (members <= 0 AND last_active < ?)",
+            (idle_since, empty_since)).fetchall()
+        return [code for code, in rows]
+
+    def rooms_by_activity(self):
+        return self._connection().execute("""
+            SELECT room.code, room.members, COALESCE(SUM(room_message.size), 0)
+            FROM room LEFT JOIN room_message ON room_message.room = room.code
+            GROUP BY room.code ORDER BY room.last_active
+        """).fetchall()
+
+    def trim_history(self, code, keep):
+        with self._write() as conn:
+            row = conn.execute("""
+                DELETE FROM room_message WHERE room = ? AND seq <= (
+                    SELECT last_seq FROM room WHERE code = ?) - ?
+                RETURNING size
+            """, (code, code, keep)).fetchall()
+            return sum(size for size, in row)
+
+    def stats(self):
+        conn = self._connection()
+        rooms, members = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(MAX(members, 0)), 0) FROM room").fetchone()
+        message_bytes, = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM room_message").fetchone()
+        return {"rooms": rooms, "members": members, "message_bytes": message_bytes}
+
+    def __contains__(self, code):
+        return self._connection().execute(
+            "SELECT 1 FROM room WHERE code = ?", (code,)).fetchone() is not None
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def create_room_store(url, capacity=500):
+    """Build a store from ``memory://`` or ``sqlite:///path/to/chat.db``."""
+    if url.startswith("sqlite:///"):
+        return SQLiteRoomStore(url[len("sqlite:///"):], capacity)
+    if url in ("", "memory://"):
+        return MemoryRoomStore(capacity)
+    raise ValueError(f"Unsupported chat store URL: {url}")
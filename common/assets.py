@@ -0,0 +1,173 @@
+"""Fingerprinted, precompressed static files shared by the apps.
+
+    python -m common.assets [static dir ...]
+
+copies every file of the apps' static folders to build/assets under a name
+that contains a hash of its content (``css/style.css`` becomes
+``css/style.2c83c8963a04.css``), writes gzip and, when the optional
+``brotli`` package is installed, brotli variants next to compressible
+files, and records the names in build/assets/manifest.json. Files with
+the same path and content in several static folders (bootstrap and
+jQuery are in two of them) end up as one file. ``url(...)`` references in
+stylesheets are rewritten to the fingerprinted names.
+
+    assets = Assets(app)
+
+serves the build from ``/assets/``, picking the variant that matches the
+request's Accept-Encoding, with an immutable one-year Cache-Control, and
+makes ``url_for('static', filename=...)`` in templates link there. Files
+missing from the manifest, or every file while the app runs in debug
+mode, keep linking to the plain static folder. Build again after changing
+a static file, then restart the apps.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import sys
+
+from flask import abort, current_app, request, send_file, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIRS = ['static', 'register/static', 'tutor_booking/static', 'your_project/static']
+BUILD_DIR = os.path.join(ROOT, 'build', 'assets')
+ONE_YEAR = 365 * 24 * 60 * 60
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def fingerprint(name, content):
+    stem, ext = posixpath.splitext(name)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def write_file(path, content):
+    if os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(content)
+    os.replace(path + '.tmp', path)
+    return True
+
+
+def rewrite_css(name, content, names):
+    """Point relative ``url(...)`` references of stylesheet ``name`` at the
+    fingerprinted files in ``names``."""
+    def replace(match):
+        quote, target = match.groups()
+        path = re.split(r'[?#]', target, maxsplit=1)[0]
+        if re.match(r'^(?:[a-z]+:|/|#)', path, re.I):
+            return match.group(0)
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(name), path))
+        if resolved not in names:
+            return match.group(0)
+        relative = posixpath.relpath(names[resolved], posixpath.dirname(name) or '.')
+        return f'url({quote}{relative}{target[len(path):]}{quote})'
+
+    return CSS_URL.sub(replace, content.decode('utf-8', 'surrogateescape')).encode('utf-8', 'surrogateescape')
+
+
+def build(static_dirs=STATIC_DIRS, build_dir=BUILD_DIR):
+    """Fingerprint and compress ``static_dirs`` (relative to the repository
+    root) into ``build_dir``. Returns ``(files, written)``."""
+    manifest = {}
+    files = written = 0
+    for static_dir in static_dirs:
+        source = os.path.join(ROOT, static_dir)
+        names = manifest[static_dir] = {}
+        paths = sorted(os.path.relpath(os.path.join(dirpath, filename), source).replace(os.sep, '/')
+                       for dirpath, _, filenames in os.walk(source) for filename in filenames)
+        # Stylesheets go last so the files they reference already have their names
+        for name in sorted(paths, key=lambda name: name.endswith('.css')):
+            with open(os.path.join(source, name), 'rb') as f:
+                content = f.read()
+            if name.endswith('.css'):
+                content = rewrite_css(name, content, names)
+            names[name] = fingerprint(name, content)
+            files += 1
+
+            target = os.path.join(build_dir, names[name])
+            written += write_file(target, content)
+            if posixpath.splitext(name)[1] not in COMPRESSIBLE:
+                continue
+            variants = [('.gz', gzip.compress(content, 9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(content, quality=11)))
+            for suffix, compressed in variants:
+                if len(compressed) < len(content):
+                    written += write_file(target + suffix, compressed)
+
+    os.makedirs(build_dir, exist_ok=True)
+    with open(os.path.join(build_dir, 'manifest.json.tmp'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(os.path.join(build_dir, 'manifest.json.tmp'), os.path.join(build_dir, 'manifest.json'))
+    return files, written
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.names = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_BUILD_DIR', BUILD_DIR)
+        app.config.setdefault('ASSETS_URL_PATH', '/assets')
+        self.build_dir = app.config['ASSETS_BUILD_DIR']
+        manifest_path = os.path.join(self.build_dir, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            static_dir = os.path.relpath(app.static_folder, ROOT).replace(os.sep, '/')
+            self.names = manifest.get(static_dir, {})
+        app.add_url_rule(app.config['ASSETS_URL_PATH'] + '/<path:filename>', 'assets', self.send)
+        app.jinja_env.globals['url_for'] = self.url_for
+
+    def url_for(self, endpoint, **values):
+        """``flask.url_for`` that links static files to their fingerprinted copy."""
+        if endpoint == 'static' and not current_app.debug:
+            name = self.names.get(values.get('filename'))
+            if name is not None:
+                return url_for('assets', **dict(values, filename=name))
+        return url_for(endpoint, **values)
+
+    def send(self, filename):
+        path = safe_join(self.build_dir, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        encoding = None
+        for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[name] and os.path.isfile(path + suffix):
+                encoding, path = name, path + suffix
+                break
+        response = send_file(path, mimetype=mimetype, max_age=ONE_YEAR, conditional=True)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        # The name changes whenever the content does, so caches never need to revalidate
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+def main():
+    static_dirs = sys.argv[1:] or STATIC_DIRS
+    files, written = build(static_dirs)
+    print(f'{files} files from {len(static_dirs)} static folders, {written} written to '
+          f'{os.path.relpath(BUILD_DIR)}' + ('' if brotli else ' (install brotli for .br variants)'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Request, SQL and Socket.IO instrumentation shared by the apps.
+
+    metrics = Metrics(app, db=db, socketio=socketio)
+
+records per-endpoint latency, the number and duration of SQL statements
+each request issues, slow statements (``METRICS_SLOW_QUERY_MS``, logged to
+the ``metrics.slow_query`` logger) and Socket.IO handler latency, and
+serves all of it in the Prometheus text format at ``/metrics``.
+
+Socket.IO handlers are only timed if they are registered after the
+Metrics object is created.
+"""
+import functools
+import inspect
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+slow_query_logger = logging.getLogger('metrics.slow_query')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self, app=None, db=None, socketio=None):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        if app is not None:
+            self.init_app(app, db, socketio)
+
+    def init_app(self, app, db=None, socketio=None):
+        app.config.setdefault('METRICS_SLOW_QUERY_MS', 100)
+        self.slow_query_seconds = app.config['METRICS_SLOW_QUERY_MS'] / 1000
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.render)
+        if db is not None:
+            with app.app_context():
+                for engine in db.engines.values():
+                    event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                    event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        if socketio is not None:
+            self._instrument_socketio(socketio)
+
+    def gauge(self, name, help, value):
+        """Report ``value()`` under ``name`` at every scrape."""
+        self._gauges[name] = (help, value)
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, labels=None, amount=1):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def _start_request(self):
+        g._metrics_start = time.perf_counter()
+        g._metrics_sql = [0, 0.0]
+
+    def _finish_request(self, response):
+        start = g.get('_metrics_start')
+        if start is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        self.observe('http_request_duration_seconds',
+                     {'endpoint': endpoint, 'method': request.method}, time.perf_counter() - start)
+        self.increment('http_requests_total', {'endpoint': endpoint, 'status': str(response.status_code)})
+        statements, sql_seconds = g._metrics_sql
+        self.observe('http_request_sql_statements', {'endpoint': endpoint}, statements, COUNT_BUCKETS)
+        self.observe('http_request_sql_duration_seconds', {'endpoint': endpoint}, sql_seconds)
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's context, which is discarded if the statement fails
+        if context is not None:
+            context._metrics_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_metrics_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        self.observe('sql_statement_duration_seconds', {}, elapsed)
+        if has_request_context():
+            counts = g.get('_metrics_sql')
+            if counts is not None:
+                counts[0] += 1
+                counts[1] += elapsed
+        if elapsed >= self.slow_query_seconds:
+            self.increment('sql_slow_statements_total')
+            slow_query_logger.warning('%.1f ms: %s', elapsed * 1000, ' '.join(statement.split())[:500])
+
+    def _instrument_socketio(self, socketio):
+        register = socketio.on
+
+        def on(message, namespace=None):
+            decorator = register(message, namespace)
+
+            def wrap(handler):
+                signature = inspect.signature(handler)
+
+                @functools.wraps(handler)
+                def timed(*args, **kwargs):
+                    # python-socketio calls again with fewer arguments when a
+                    # handler does not accept them (e.g. the disconnect reason);
+                    # only the call that reaches the handler is timed
+                    try:
+                        signature.bind(*args, **kwargs)
+                    except TypeError:
+                        return handler(*args, **kwargs)
+                    start = time.perf_counter()
+                    try:
+                        return handler(*args, **kwargs)
+                    finally:
+                        self.observe('socketio_event_duration_seconds', {'event': message},
+                                     time.perf_counter() - start)
+                decorator(timed)
+                return handler
+            return wrap
+
+        socketio.on = on
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.buckets), list(h.counts), h.sum, h.count) for key, h in histograms]
+
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name}{_labels(labels)} {value}')
+        for (name, labels), buckets, counts, total, count in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# TYPE {name} histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+        for name, (help, value) in sorted(self._gauges.items()):
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value()}')
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (f'{key}="{_escape(value)}"' for key, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -1,24 +1,113 @@
-from flask import Flask, render_template, request, session, redirect, url_for
+from flask import Flask, render_template, request, session, redirect, url_for, jsonify
 from flask_socketio import join_room, leave_room, send, SocketIO
-import random
-from string import ascii_uppercase
+import logging
+import os
+import time
+
+from chat.codes import RoomCodeAllocator
+from chat.log import MessageLog, configure_async_logging
+from chat.pubsub import create_client_manager
+from chat.store import create_room_store
+from common.assets import Assets
+from common.metrics import Metrics
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "Ruben@24"
-socketio = SocketIO(app)
+# Messages kept per room, and how many are sent with each page of history
+app.config["CHAT_HISTORY_CAPACITY"] = 500
+app.config["CHAT_HISTORY_PAGE_SIZE"] = 50
+# "memory://" keeps rooms inside this process. To run several worker processes
+# (each with its own PORT, behind a load balancer with sticky sessions), point
+# them all at the same "sqlite:///path/to/chat.db": room state is shared there
+# and broadcasts are relayed between the workers.
+app.config["CHAT_STORE_URL"] = os.environ.get("CHAT_STORE_URL", "memory://")
+# Persistent message log, written in batches of N messages or every T milliseconds
+app.config["CHAT_LOG_PATH"] = os.environ.get("CHAT_LOG_PATH", os.path.join(app.instance_path, "chat_log.db"))
+app.config["CHAT_LOG_BATCH_SIZE"] = 100
+app.config["CHAT_LOG_FLUSH_MS"] = 50
+# Room codes get one character longer once this share of them is in use
+app.config["ROOM_CODE_LENGTH"] = 4
+app.config["ROOM_CODE_MAX_OCCUPANCY"] = 0.9
+# Rooms are closed after this many seconds without activity (sooner when
+# nobody is in them), and the least recently active rooms are trimmed or
+# closed while retained messages exceed the memory budget (in bytes)
+app.config["CHAT_ROOM_IDLE_TTL"] = 60 * 60
+app.config["CHAT_EMPTY_ROOM_TTL"] = 5 * 60
+app.config["CHAT_MEMORY_BUDGET"] = 64 * 1024 * 1024
+app.config["CHAT_REAPER_INTERVAL"] = 5
+
+os.makedirs(os.path.dirname(app.config["CHAT_LOG_PATH"]) or ".", exist_ok=True)
+logger = logging.getLogger("chat")
+configure_async_logging(logger)
+
+rooms = create_room_store(app.config["CHAT_STORE_URL"], app.config["CHAT_HISTORY_CAPACITY"])
+room_codes = RoomCodeAllocator(app.config["ROOM_CODE_LENGTH"], app.config["ROOM_CODE_MAX_OCCUPANCY"])
+message_log = MessageLog(app.config["CHAT_LOG_PATH"], app.config["CHAT_LOG_BATCH_SIZE"], app.config["CHAT_LOG_FLUSH_MS"])
+socketio = SocketIO(app, client_manager=create_client_manager(app.config["CHAT_STORE_URL"]))
+assets = Assets(app)
+# Created before the handlers below so that they are timed too
+metrics = Metrics(app, socketio=socketio)
+metrics.gauge("chat_rooms", "Open chat rooms", lambda: rooms.stats()["rooms"])
+metrics.gauge("chat_members", "Members connected to chat rooms", lambda: rooms.stats()["members"])
+metrics.gauge("chat_message_bytes", "Approximate bytes of retained chat history", lambda: rooms.stats()["message_bytes"])
+
+def restore_room(code):
+    # Rooms that were live before a restart only exist in the message log
+    messages = message_log.recent(code, app.config["CHAT_HISTORY_CAPACITY"])
+    if not messages:
+        return False
+    if rooms.load_room(code, messages):
+        room_codes.reserve(code)
+    logger.info("event=room_restored room=%s messages=%d", code, len(messages))
+    return True
+
+def close_room(code, reason):
+    socketio.send({"name": "System", "message": f"This room was closed ({reason})"}, to=code)
+    rooms.delete_room(code)
+    # Members still connected would keep writing to (and on leaving, release)
+    # the room that gets this code next, so disconnect them
+    for sid, _ in list(socketio.server.manager.get_participants("/", code)):
+        socketio.server.disconnect(sid, namespace="/")
+    socketio.close_room(code)
+    message_log.drop(code)
+    room_codes.release(code)
+    logger.info("event=room_closed room=%s reason=%s", code, reason)
 
-rooms = {}
+def reap_rooms():
+    now = time.time()
+    for code in rooms.idle_rooms(now - app.config["CHAT_ROOM_IDLE_TTL"], now - app.config["CHAT_EMPTY_ROOM_TTL"]):
+        close_room(code, "inactive")
 
-def generate_unique_code(length):
+    budget = app.config["CHAT_MEMORY_BUDGET"]
+    total = rooms.stats()["message_bytes"]
+    if total <= budget:
+        return
+
+    # Least recently active rooms go first: empty ones are closed, the others
+    # keep only their newest page. If that is not enough, close rooms outright.
+    by_activity = rooms.rooms_by_activity()
+    for code, members, size in by_activity:
+        if total <= budget:
+            return
+        if members <= 0:
+            close_room(code, "memory")
+            total -= size
+        else:
+            total -= rooms.trim_history(code, app.config["CHAT_HISTORY_PAGE_SIZE"])
+    for code, members, size in by_activity:
+        if total <= budget:
+            return
+        if members > 0:
+            close_room(code, "memory")
+            total = rooms.stats()["message_bytes"]
+
+def room_reaper():
     while True:
-        code = ""
-        for _ in range(length):
-            code += random.choice(ascii_uppercase)
-        
-        if code not in rooms:
-            break
-    
-    return code
+        socketio.sleep(app.config["CHAT_REAPER_INTERVAL"])
+        try:
+            reap_rooms()
+        except Exception:
+            logger.exception("event=reaper_failed")
 
 @app.route("/", methods=["POST", "GET"])
 def home():
@@ -37,9 +126,14 @@ def home():
         
         room = code
         if create != False:
-            room = generate_unique_code(4)
-            rooms[room] = {"members": 0, "messages": []}
-        elif code not in rooms:
+            room = room_codes.allocate()
+            # Another worker may have taken the same code in the meantime;
+            # its room is released there, so give the code back here
+            while not rooms.create_room(room):
+                room_codes.release(room)
+                room = room_codes.allocate()
+            message_log.drop(room)
+        elif code not in rooms and not restore_room(code):
             return render_template("home.html", error="Room does not exist!", code=code, name=name)
         
         session["room"] = room
@@ -54,21 +148,40 @@ def room():
     if room is None or session.get("name") is None or room not in rooms:
         return redirect(url_for('home'))
 
-    return render_template("room.html", code=room, messages=rooms[room]["messages"]) 
+    messages, cursor = rooms.history(room, limit=app.config["CHAT_HISTORY_PAGE_SIZE"])
+    return render_template("room.html", code=room, messages=messages, cursor=cursor)
+
+@app.route("/room/history")
+def room_history():
+    room = session.get("room")
+    if room is None or room not in rooms:
+        return jsonify(error="Room does not exist!"), 404
+
+    page_size = app.config["CHAT_HISTORY_PAGE_SIZE"]
+    before = request.args.get("before", type=int)
+    limit = max(1, min(request.args.get("limit", page_size, type=int), page_size))
+    messages, cursor = rooms.history(room, before, limit)
+    return jsonify(messages=messages, cursor=cursor)
+
+@app.route("/stats")
+def stats():
+    return jsonify(rooms.stats())
 
 @socketio.on("message")
 def message(data):
     room = session.get("room")
-    if room not in rooms:
-        return
-    
     content = {
         "name": session.get("name"),
-        "message": data["data"]
+        "message": data["data"],
+        "time": time.time()
     }
-    send(content, to=room)
-    rooms[room]["messages"].append(content)
-    print(f"{session.get('name')} said: {data['data']}")
+    entry = rooms.append_message(room, content)
+    if entry is None:
+        return
+
+    send(entry, to=room)
+    message_log.append(room, entry)
+    logger.debug("event=message room=%s name=%s seq=%d", room, entry["name"], entry["seq"])
 
 @socketio.on("connect")
 def connect(auth):
@@ -76,14 +189,13 @@ def connect(auth):
     name = session.get("name")
     if not room or not name:
         return
-    if room not in rooms:
+    if rooms.join(room) is None and not (restore_room(room) and rooms.join(room)):
         leave_room(room)
         return
     
     join_room(room)
     send({"name": name, "message": "has entered the room"}, to=room)
-    rooms[room]["members"] += 1
-    print(f"{name} joined room {room}")
+    logger.info("event=join room=%s name=%s", room, name)
 
 @socketio.on("disconnect")
 def disconnect():
@@ -91,13 +203,16 @@ def disconnect():
     name = session.get("name")
     leave_room(room)
 
-    if room in rooms:
-        rooms[room]["members"] -= 1
-        if rooms[room]["members"] <= 0:
-            del rooms[room]
-    
-    send({"name": name, "message": "has left the room"}, to=room)
-    print(f"{name} has left the room {room}")
+    # None when the room was closed, which already told its members
+    members = rooms.leave(room)
+    if members == 0:
+        message_log.drop(room)
+        room_codes.release(room)
+    if members is not None:
+        send({"name": name, "message": "has left the room"}, to=room)
+    logger.info("event=leave room=%s name=%s", room, name)
+
+socketio.start_background_task(room_reaper)
 
 if __name__ == "__main__":
-    socketio.run(app, debug=True)
\ No newline at end of file
+    socketio.run(app, debug=True, port=int(os.environ.get("PORT", 5000)))
\ No newline at end of file
@@ -0,0 +1,212 @@
+import atexit
+import threading
+from collections import Counter
+
+from flask import Flask, render_template, request, redirect, url_for
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, text
+
+from common.assets import Assets
+from common.metrics import Metrics
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['QUESTIONS_PER_PAGE'] = 20
+app.config['ANSWERS_PER_PAGE'] = 50
+# Upvotes are written in one batch every N seconds, or sooner once this many are waiting
+app.config['UPVOTE_FLUSH_INTERVAL'] = 1.0
+app.config['UPVOTE_MAX_PENDING'] = 500
+db = SQLAlchemy(app)
+metrics = Metrics(app, db)
+assets = Assets(app)
+
+
+class Question(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    content = db.Column(db.Text, nullable=False)
+    answers = db.relationship('Answer', backref='question', cascade='all, delete-orphan',
+                              lazy='dynamic')
+
+
+class Answer(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    content = db.Column(db.Text, nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
+    upvotes = db.Column(db.Integer, default=0)
+    __table_args__ = (db.Index('ix_answer_question_id_upvotes', 'question_id', 'upvotes'),)
+
+
+class UpvoteBuffer:
+    """Collects upvotes in memory and hands them to ``flush`` in batches.
+
+    A click only bumps a counter; the background thread turns everything
+    collected into one transaction every ``interval`` seconds, or as soon
+    as ``max_pending`` votes are waiting, so a popular answer costs one
+    write per batch instead of one per click.
+    """
+
+    def __init__(self, flush, interval=1.0, max_pending=500):
+        self._flush = flush
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = Counter()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='upvote-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def add(self, answer_id):
+        with self._lock:
+            self._pending[answer_id] += 1
+            self._total += 1
+            if self._total >= self.max_pending:
+                self._wake.set()
+
+    def pending(self, answer_id):
+        return self._pending.get(answer_id, 0)
+
+    def discard(self, answer_id):
+        with self._lock:
+            self._total -= self._pending.pop(answer_id, 0)
+
+    def flush(self):
+        with self._lock:
+            counts, self._pending = self._pending, Counter()
+            self._total = 0
+        if not counts:
+            return
+        try:
+            self._flush(counts)
+        except Exception:
+            # Keep the votes for the next attempt
+            with self._lock:
+                self._pending.update(counts)
+                self._total += sum(counts.values())
+            app.logger.exception('Failed to flush %d upvotes', sum(counts.values()))
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+
+def write_upvotes(counts):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(
+                text('UPDATE answer SET upvotes = COALESCE(upvotes, 0) + :count WHERE id = :id'),
+                [{'id': answer_id, 'count': count} for answer_id, count in counts.items()],
+            )
+
+
+@event.listens_for(db.Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers carry on while a batch of upvotes is being written
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA busy_timeout=5000')
+    cursor.close()
+
+
+upvotes = UpvoteBuffer(write_upvotes, app.config['UPVOTE_FLUSH_INTERVAL'], app.config['UPVOTE_MAX_PENDING'])
+metrics.gauge('qna_pending_upvotes', 'Upvotes waiting to be written', lambda: upvotes._total)
+
+with app.app_context():
+    db.create_all()
+    # create_all() skips the existing answer table, so add its index here
+    for index in Answer.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+
+def question_page(query):
+    """One page of questions, newest first, continuing from ``?before=<id>``."""
+    before = request.args.get('before', type=int)
+    if before is not None:
+        query = query.filter(Question.id < before)
+    limit = app.config['QUESTIONS_PER_PAGE']
+    questions = query.order_by(Question.id.desc()).limit(limit + 1).all()
+    next_before = questions[limit - 1].id if len(questions) > limit else None
+    return questions[:limit], next_before
+
+
+@app.route('/')
+def index():
+    questions, next_before = question_page(Question.query)
+    return render_template('qna_question.html', questions=questions, next_before=next_before)
+
+
+@app.route('/search')
+def search_questions():
+    search = request.args.get('query', '').strip()
+    query = Question.query
+    if search:
+        escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(Question.content.ilike(f'%{escaped}%', escape='\\'))
+    questions, next_before = question_page(query)
+    return render_template('qna_question.html', questions=questions, next_before=next_before,
+                           query=search)
+
+
+@app.route('/submit-question', methods=['POST'])
+def submit_question():
+    content = request.form.get('question', '').strip()
+    if content:
+        db.session.add(Question(content=content))
+        db.session.commit()
+    return redirect(url_for('index'))
+
+
+@app.route('/question/<int:question_id>', methods=['GET', 'POST'])
+def view_question(question_id):
+    question = Question.query.get_or_404(question_id)
+    if request.method == 'POST':
+        content = request.form.get('answer', '').strip()
+        if content:
+            db.session.add(Answer(content=content, question_id=question.id, upvotes=0))
+            db.session.commit()
+        return redirect(url_for('view_question', question_id=question.id))
+
+    # Served from ix_answer_question_id_upvotes, most upvoted first
+    answers = (question.answers
+               .order_by(Answer.upvotes.desc(), Answer.id.desc())
+               .limit(app.config['ANSWERS_PER_PAGE'])
+               .all())
+    # Include votes that are still waiting to be written
+    upvote_counts = {answer.id: (answer.upvotes or 0) + upvotes.pending(answer.id) for answer in answers}
+    return render_template('qna_view_question.html', question=question, answers=answers,
+                           upvote_counts=upvote_counts)
+
+
+@app.route('/answer/<int:answer_id>/upvote', methods=['POST'])
+def upvote_answer(answer_id):
+    answer = Answer.query.get_or_404(answer_id)
+    upvotes.add(answer.id)
+    return redirect(url_for('view_question', question_id=answer.question_id))
+
+
+@app.route('/answer/<int:answer_id>/delete', methods=['POST'])
+def delete_answer(answer_id):
+    answer = Answer.query.get_or_404(answer_id)
+    question_id = answer.question_id
+    upvotes.discard(answer.id)
+    db.session.delete(answer)
+    db.session.commit()
+    return redirect(url_for('view_question', question_id=question_id))
+
+
+@app.route('/question/<int:question_id>/delete', methods=['POST'])
+def delete_question(question_id):
+    question = Question.query.get_or_404(question_id)
+    for answer_id, in db.session.query(Answer.id).filter_by(question_id=question.id):
+        upvotes.discard(answer_id)
+    db.session.delete(question)
+    db.session.commit()
+    return redirect(url_for('index'))
+
+
+if __name__ == '__main__':
+    app.run(debug=True)
@@ -1,16 +1,32 @@
+import os
+
 from flask import Flask, request, render_template, redirect, url_for, flash, session
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 
-app = Flask(__name__)
+from common.assets import Assets
+from common.metrics import Metrics
+from register.hashing import HashingBusy, PasswordHasher
+
+# python -m register.app from the repository root; instance/ stays in this folder
+app = Flask(__name__, instance_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance'))
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test.db'
+# Changing the method upgrades existing hashes as their users log in
+app.config['PASSWORD_HASH_METHOD'] = 'scrypt:32768:8:1'
+app.config['PASSWORD_HASH_WORKERS'] = None  # one per core
+app.config['PASSWORD_HASH_MAX_PENDING'] = None  # 4 per worker
+# Any of the above can be overridden with FLASK_<NAME> environment variables
+app.config.from_prefixed_env()
 db = SQLAlchemy(app)
+metrics = Metrics(app, db)
+assets = Assets(app)
+hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'],
+                        app.config['PASSWORD_HASH_MAX_PENDING'])
 
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True)
-    password = db.Column(db.String(80))
+    password = db.Column(db.String(255))
 
     def __int__(self, username, password):
         self.username = username
@@ -29,7 +45,7 @@ def register():
         else:
             new_user = User(
             username = request.form['username'],
-            password = generate_password_hash(request.form.get('password')))
+            password = hasher.hash(request.form.get('password')))
             db.session.add(new_user)
             db.session.commit()
             flash('You have successfully registered,Please login')
@@ -49,7 +65,13 @@ def login():
         query_user = User.query.filter_by(username=username).first()
 
         if query_user:
-            if check_password_hash(query_user.password, password):
+            if hasher.verify(query_user.password, password):
+                if hasher.needs_rehash(query_user.password):
+                    try:
+                        query_user.password = hasher.hash(password)
+                        db.session.commit()
+                    except HashingBusy:
+                        pass  # try again at the next login
                 session['logged_in'] = True
                 return redirect(url_for('home'))
             else:
@@ -61,6 +83,11 @@ def login():
 
 
 
+@app.errorhandler(HashingBusy)
+def hashing_busy(error):
+    return 'Server is busy, please try again shortly.', 503, {'Retry-After': '1'}
+
+
 @app.route('/')
 def home():
     if not session.get('logged_in'):
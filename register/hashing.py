@@ -0,0 +1,69 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full; the request should be retried later."""
+
+
+class PasswordHasher:
+    """Runs password hashing and verification in a pool of worker processes.
+
+    Key derivation is deliberately slow, and doing it on the request thread
+    holds the GIL and stalls every other route. At most ``max_pending`` jobs
+    may be queued or running; past that ``HashingBusy`` is raised straight
+    away instead of letting requests pile up behind the pool.
+
+    ``method`` is a full werkzeug method spec such as ``scrypt:32768:8:1`` or
+    ``pbkdf2:sha256:600000``; hashes made with anything else are reported by
+    ``needs_rehash`` so they can be upgraded at the next login.
+    """
+
+    def __init__(self, method='scrypt:32768:8:1', workers=None, max_pending=None, timeout=30):
+        self.method = method
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            with self._lock:
+                if self._executor is None:
+                    # Started on first use; spawn avoids forking a threaded server
+                    self._executor = ProcessPoolExecutor(
+                        self.workers, mp_context=multiprocessing.get_context('spawn'))
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Drop the job if it has not started; a running one keeps its slot until done
+            future.cancel()
+            raise HashingBusy()
+
+    def hash(self, password):
+        return self._submit(generate_password_hash, password, method=self.method)
+
+    def verify(self, pwhash, password):
+        return self._submit(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,29 @@
+import importlib
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def tutor_db(tmp_path):
+    return tmp_path / 'tutors.db'
+
+
+@pytest.fixture
+def load_tutor_app(tutor_db, monkeypatch):
+    """Import a fresh tutor_booking.app backed by ``tutor_db`` and run
+    init_db(), so a test can prepare the file first."""
+    def load():
+        monkeypatch.setenv('FLASK_SQLALCHEMY_DATABASE_URI', f'sqlite:///{tutor_db}')
+        monkeypatch.setenv('FLASK_WTF_CSRF_ENABLED', 'false')
+        sys.modules.pop('tutor_booking.app', None)
+        module = importlib.import_module('tutor_booking.app')
+        with module.app.app_context():
+            module.init_db()
+        return module
+    return load
+
+
+@pytest.fixture
+def tutor_app(load_tutor_app):
+    return load_tutor_app()
@@ -0,0 +1,162 @@
+import sqlite3
+import threading
+
+import pytest
+from sqlalchemy import event, inspect
+
+
+def add_tutor(module, name='Aina Tan', subject='Physics', slots='Mon 10:00, Wed 14:00'):
+    with module.app.app_context():
+        tutor = module.Tutor(name=name, phone='0123456789', subject=subject, available_slots=slots)
+        module.db.session.add(tutor)
+        module.db.session.commit()
+        return tutor.id
+
+
+def test_parallel_bookings_of_one_slot_book_it_once(tutor_app):
+    tutor_id = add_tutor(tutor_app)
+    threads = 16
+    barrier = threading.Barrier(threads)
+    statuses = []
+
+    def book(i):
+        client = tutor_app.app.test_client()
+        barrier.wait()
+        response = client.post(f'/book/{tutor_id}', data={'student_name': f'student{i}', 'slot': 'Mon 10:00'})
+        statuses.append(response.status_code)
+
+    workers = [threading.Thread(target=book, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    # The winner is redirected, everyone else gets the form back
+    assert sorted(statuses) == [200] * (threads - 1) + [302]
+    with tutor_app.app.app_context():
+        bookings = tutor_app.Booking.query.all()
+        claimed = tutor_app.TutorSlot.query.filter(tutor_app.TutorSlot.booking_id.isnot(None)).all()
+        assert len(bookings) == 1
+        assert [(slot.start, slot.booking_id) for slot in claimed] == [('Mon 10:00', bookings[0].id)]
+        assert tutor_app.db.session.get(tutor_app.Tutor, tutor_id).free_slots == ['Wed 14:00']
+
+
+def test_edit_keeps_a_slot_booked_meanwhile(tutor_app):
+    tutor_id = add_tutor(tutor_app)
+    module = tutor_app
+    with module.app.app_context():
+        tutor = module.db.session.get(module.Tutor, tutor_id)
+        assert tutor.free_slots == ['Mon 10:00', 'Wed 14:00']
+
+        # Another request books Mon 10:00 after the edit form loaded the tutor
+        booking = module.Booking(student_name='Mei', slot='Mon 10:00', tutor_id=tutor_id)
+        module.db.session.add(booking)
+        module.db.session.flush()
+        module.db.session.execute(
+            module.update(module.TutorSlot)
+            .where(module.TutorSlot.tutor_id == tutor_id, module.TutorSlot.start == 'Mon 10:00')
+            .values(booking_id=booking.id)
+            .execution_options(synchronize_session=False)
+        )
+
+        tutor.available_slots = 'Wed 14:00, Fri 09:00'
+        module.db.session.commit()
+
+    with module.app.app_context():
+        slots = module.TutorSlot.query.filter_by(tutor_id=tutor_id).order_by(module.TutorSlot.start).all()
+        assert [(slot.start, slot.booking_id is not None) for slot in slots] == [
+            ('Fri 09:00', False), ('Mon 10:00', True), ('Wed 14:00', False)]
+
+
+def test_migrate_available_slots_from_legacy_schema(tutor_db, load_tutor_app):
+    conn = sqlite3.connect(tutor_db)
+    conn.executescript("""
+        CREATE TABLE tutor (id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, phone VARCHAR(20) NOT NULL,
+                            subject VARCHAR(100) NOT NULL, available_slots VARCHAR(200) NOT NULL,
+                            PRIMARY KEY (id));
+        CREATE TABLE booking (id INTEGER NOT NULL, student_name VARCHAR(100) NOT NULL,
+                              slot VARCHAR(100) NOT NULL, tutor_id INTEGER NOT NULL,
+                              PRIMARY KEY (id), FOREIGN KEY(tutor_id) REFERENCES tutor (id));
+        INSERT INTO tutor VALUES (1, 'Aina Tan', '0123456789', 'Physics', 'Mon 10:00, Wed 14:00,,Mon 10:00');
+        INSERT INTO tutor VALUES (2, 'Raj Kumar', '0198765432', 'Chemistry', 'Fri 09:00');
+        -- Booked while still listed, and booked after being removed from the list
+        INSERT INTO booking VALUES (1, 'Mei', ' Wed 14:00', 1);
+        INSERT INTO booking VALUES (2, 'Wei', 'Tue 11:00', 2);
+    """)
+    conn.commit()
+    conn.close()
+
+    module = load_tutor_app()
+
+    with module.app.app_context():
+        assert 'available_slots' not in [c['name'] for c in inspect(module.db.engine).get_columns('tutor')]
+        slots = sorted((slot.tutor_id, slot.start, slot.booking_id) for slot in module.TutorSlot.query)
+        assert slots == [
+            (1, 'Mon 10:00', None),
+            (1, 'Wed 14:00', 1),
+            (2, 'Fri 09:00', None),
+            (2, 'Tue 11:00', 2),
+        ]
+        assert module.db.session.get(module.Tutor, 1).free_slots == ['Mon 10:00']
+        # Bookings and the search index carry over
+        assert module.Booking.query.count() == 2
+        assert [t.name for t in module.search_tutors('chemistry')[0]] == ['Raj Kumar']
+
+    # Running it again on the migrated schema is a no-op
+    load_tutor_app()
+
+
+def count_statements(module, client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with module.app.app_context():
+        engine = module.db.engine
+    module.page_cache.clear()
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return response, statements
+
+
+@pytest.fixture
+def booked_tutors(tutor_app):
+    """Three tutors with nine bookings between them, by three students."""
+    tutor_ids = [add_tutor(tutor_app, name, subject, ', '.join(f'Mon {hour}:00' for hour in range(9, 12)))
+                 for name, subject in [('Aina Tan', 'Physics'), ('Raj Kumar', 'Chemistry'), ('Mei Lim', 'Biology')]]
+    client = tutor_app.app.test_client()
+    for tutor_id in tutor_ids:
+        for hour in range(9, 12):
+            client.post(f'/book/{tutor_id}', data={'student_name': f'student{hour % 3}', 'slot': f'Mon {hour}:00'})
+    with tutor_app.app.app_context():
+        assert tutor_app.Booking.query.count() == 9
+    return tutor_ids
+
+
+@pytest.mark.parametrize('query, rows', [
+    ('', 9),
+    ('?tutor_id={tutor_id}', 3),
+    ('?student=student1', 3),
+    ('?after={first_booking}', 8),
+])
+def test_bookings_page_is_one_statement(tutor_app, booked_tutors, query, rows):
+    tutor_app.app.config['BOOKINGS_PER_PAGE'] = 5
+    query = query.format(tutor_id=booked_tutors[1], first_booking=1)
+    response, statements = count_statements(tutor_app, tutor_app.app.test_client(), '/bookings' + query)
+    assert len(statements) == 1, statements
+    # Every listed booking shows its tutor's name, which would cost a query each without the join
+    assert response.get_data(as_text=True).count('<tr>') - 1 == min(rows, 5)
+
+
+def test_home_page_is_one_statement(tutor_app, booked_tutors):
+    tutor_app.app.config['TUTORS_PER_PAGE'] = 2
+    client = tutor_app.app.test_client()
+    for url in ('/', f'/?after={booked_tutors[0]}'):
+        response, statements = count_statements(tutor_app, client, url)
+        assert len(statements) == 1, statements
+        assert response.get_data(as_text=True).count('/edit_tutor/') == 2
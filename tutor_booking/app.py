@@ -1,13 +1,33 @@
-from flask import Flask, render_template, redirect, url_for, flash, request
+import os
+import re
+
+from flask import Flask, render_template, redirect, url_for, flash, request, make_response
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import delete, inspect, text, update
+from sqlalchemy.orm import joinedload
 from flask_wtf import FlaskForm
 from wtforms import StringField, SubmitField
 from wtforms.validators import DataRequired
 
-app = Flask(__name__)
+from common.assets import Assets
+from common.metrics import Metrics
+from tutor_booking.page_cache import PageCache
+
+# python -m tutor_booking.app from the repository root; instance/ stays in this folder
+app = Flask(__name__, instance_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance'))
 app.config['SECRET_KEY'] = 'your_secret_key'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tutors.db'
+app.config['TUTORS_PER_PAGE'] = 20
+app.config['SUGGESTIONS_LIMIT'] = 10
+app.config['BOOKINGS_PER_PAGE'] = 50
+app.config['PAGE_CACHE_MAX_ENTRIES'] = 1024
+app.config['PAGE_CACHE_MAX_BYTES'] = 32 * 1024 * 1024
+# Any of the above can be overridden with FLASK_<NAME> environment variables
+app.config.from_prefixed_env()
 db = SQLAlchemy(app)
+metrics = Metrics(app, db)
+assets = Assets(app)
+page_cache = PageCache(app.config['PAGE_CACHE_MAX_ENTRIES'], app.config['PAGE_CACHE_MAX_BYTES'])
 
 # Tutor Model
 class Tutor(db.Model):
@@ -15,14 +35,53 @@ class Tutor(db.Model):
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20), nullable=False)
     subject = db.Column(db.String(100), nullable=False)
-    available_slots = db.Column(db.String(200), nullable=False)
+    slots = db.relationship('TutorSlot', backref='tutor', order_by='TutorSlot.start',
+                            cascade='all, delete-orphan')
+
+    @property
+    def free_slots(self):
+        return [slot.start for slot in self.slots if slot.booking_id is None]
+
+    # Comma-separated free slots, as edited through TutorForm
+    @property
+    def available_slots(self):
+        return ', '.join(self.free_slots)
+
+    @available_slots.setter
+    def available_slots(self, value):
+        wanted = list(dict.fromkeys(s.strip() for s in value.split(',') if s.strip()))
+        existing = {slot.start: slot for slot in self.slots}
+        dropped = [slot for slot in existing.values()
+                   if slot.start not in wanted and slot.booking_id is None]
+        if dropped:
+            # Delete the slots only if they are still free, like book_slot claims
+            # them; one booked meanwhile stays until its booking is canceled
+            db.session.execute(
+                delete(TutorSlot)
+                .where(TutorSlot.id.in_([slot.id for slot in dropped]), TutorSlot.booking_id.is_(None))
+                .execution_options(synchronize_session=False)
+            )
+            for slot in dropped:
+                db.session.expunge(slot)
+            db.session.expire(self, ['slots'])
+        for start in wanted:
+            if start not in existing:
+                self.slots.append(TutorSlot(start=start))
+
+# One bookable slot of a tutor; booking_id is set while the slot is taken
+class TutorSlot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    tutor_id = db.Column(db.Integer, db.ForeignKey('tutor.id'), nullable=False)
+    start = db.Column(db.String(100), nullable=False)
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=True)
+    __table_args__ = (db.Index('ix_tutor_slot_tutor_id_start', 'tutor_id', 'start', unique=True),)
 
 # Booking Model
 class Booking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    student_name = db.Column(db.String(100), nullable=False)
+    student_name = db.Column(db.String(100), nullable=False, index=True)
     slot = db.Column(db.String(100), nullable=False)
-    tutor_id = db.Column(db.Integer, db.ForeignKey('tutor.id'), nullable=False)
+    tutor_id = db.Column(db.Integer, db.ForeignKey('tutor.id'), nullable=False, index=True)
     tutor = db.relationship('Tutor', backref='bookings')
 
 # Tutor Form
@@ -39,22 +98,154 @@ class BookingForm(FlaskForm):
     slot = StringField('Slot', validators=[DataRequired()])
     submit = SubmitField('Book Slot')
 
+def migrate_available_slots():
+    """Move the old comma-separated tutor.available_slots column into tutor_slot rows."""
+    if 'available_slots' not in [c['name'] for c in inspect(db.engine).get_columns('tutor')]:
+        return
+    with db.engine.begin() as conn:
+        # Booked slots first, so a slot that is both booked and listed stays booked
+        conn.execute(text(
+            'INSERT OR IGNORE INTO tutor_slot (tutor_id, start, booking_id) '
+            'SELECT tutor_id, TRIM(slot), id FROM booking'))
+        rows = conn.execute(text('SELECT id, available_slots FROM tutor')).fetchall()
+        conn.execute(
+            text('INSERT OR IGNORE INTO tutor_slot (tutor_id, start) VALUES (:tutor_id, :start)'),
+            [{'tutor_id': tutor_id, 'start': start.strip()}
+             for tutor_id, slots in rows for start in slots.split(',') if start.strip()])
+        conn.execute(text('ALTER TABLE tutor DROP COLUMN available_slots'))
+
+def create_search_index():
+    """Full-text index over tutor name and subject, kept in sync with the
+    tutor table by triggers, so add_tutor and edit_tutor need no extra work."""
+    with db.engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tutor_fts'")).first()
+        if exists:
+            return
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE tutor_fts USING fts5(name, subject, content='tutor', "
+            "content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"))
+        conn.execute(text(
+            "CREATE TRIGGER tutor_fts_insert AFTER INSERT ON tutor BEGIN "
+            "INSERT INTO tutor_fts (rowid, name, subject) VALUES (new.id, new.name, new.subject); END"))
+        conn.execute(text(
+            "CREATE TRIGGER tutor_fts_delete AFTER DELETE ON tutor BEGIN "
+            "INSERT INTO tutor_fts (tutor_fts, rowid, name, subject) "
+            "VALUES ('delete', old.id, old.name, old.subject); END"))
+        conn.execute(text(
+            "CREATE TRIGGER tutor_fts_update AFTER UPDATE OF name, subject ON tutor BEGIN "
+            "INSERT INTO tutor_fts (tutor_fts, rowid, name, subject) "
+            "VALUES ('delete', old.id, old.name, old.subject); "
+            "INSERT INTO tutor_fts (rowid, name, subject) VALUES (new.id, new.name, new.subject); END"))
+        conn.execute(text("INSERT INTO tutor_fts (tutor_fts) VALUES ('rebuild')"))
+
+def init_db():
+    db.create_all()
+    # create_all() skips tables that already exist, so add indexes declared since
+    for index in Booking.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    migrate_available_slots()
+    create_search_index()
+
+def keyset_page(query, column, after, limit):
+    """Return ``(items, next_cursor)`` for the ``limit`` rows of ``query``
+    that follow ``after`` in ``column`` order."""
+    if after is not None:
+        query = query.filter(column > after)
+    items = query.order_by(column).limit(limit + 1).all()
+    if len(items) > limit:
+        return items[:limit], getattr(items[limit - 1], column.key)
+    return items, None
+
+def fts_query(search, prefix=False):
+    # Quote every word so user input can never be read as FTS5 syntax
+    terms = re.findall(r'\w+', search)
+    return ' '.join(f'"{term}"' + ('*' if prefix else '') for term in terms)
+
+def search_tutors(search, prefix=False, after=None, limit=20):
+    """Return ``(tutors, next_cursor)`` for one page of tutors matching
+    ``search``, best match first (name hits weigh more than subject hits).
+
+    Pages are keyset-paginated on (rank, id); ``after`` is the cursor
+    returned for the previous page.
+    """
+    query = fts_query(search, prefix)
+    if not query:
+        return [], None
+
+    sql = ("SELECT rowid, bm25(tutor_fts, 10.0, 5.0) AS rank FROM tutor_fts "
+           "WHERE tutor_fts MATCH :query")
+    params = {'query': query, 'limit': limit + 1}
+    if after:
+        rank, _, last_id = after.partition(':')
+        try:
+            params.update(rank=float(rank), last_id=int(last_id))
+            sql += " AND (bm25(tutor_fts, 10.0, 5.0), rowid) > (:rank, :last_id)"
+        except ValueError:
+            pass
+    sql += " ORDER BY rank, rowid LIMIT :limit"
+    rows = db.session.execute(text(sql), params).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f'{rows[-1].rank!r}:{rows[-1].rowid}'
+    found = {tutor.id: tutor for tutor in Tutor.query.filter(Tutor.id.in_([row.rowid for row in rows]))}
+    return [found[row.rowid] for row in rows if row.rowid in found], next_cursor
+
+def cached_page(tags, render, mimetype='text/html'):
+    """Serve ``render()`` from the page cache, with an ETag so a client that
+    already has the page gets a 304.
+
+    Pages listing tutors carry the ``tutors`` tag and a tutor's own pages
+    ``tutor:<id>``; the views that write call ``page_cache.invalidate``.
+    """
+    cached = page_cache.get(request.full_path)
+    if cached is None:
+        snapshot = page_cache.snapshot(tags)
+        cached = page_cache.set(request.full_path, render().encode(), snapshot)
+
+    body, etag = cached
+    response = make_response(body)
+    response.mimetype = mimetype
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
 @app.route('/', methods=['GET'])
 def home():
-    search_query = request.args.get('search', '')
-    if search_query:
-        tutors = Tutor.query.filter(
-            (Tutor.name.ilike(f'%{search_query}%')) | 
-            (Tutor.subject.ilike(f'%{search_query}%'))
-        ).all()
-    else:
-        tutors = Tutor.query.all()
-    return render_template('home.html', tutors=tutors)
+    def render():
+        search_query = request.args.get('search', '')
+        if search_query:
+            tutors, next_cursor = search_tutors(
+                search_query,
+                prefix=request.args.get('mode') == 'prefix',
+                after=request.args.get('after'),
+                limit=app.config['TUTORS_PER_PAGE'],
+            )
+        else:
+            tutors, next_cursor = keyset_page(Tutor.query, Tutor.id, request.args.get('after', type=int),
+                                              app.config['TUTORS_PER_PAGE'])
+        return render_template('home.html', tutors=tutors, next_cursor=next_cursor)
+
+    return cached_page(['tutors'], render)
+
+@app.route('/search/suggest')
+def suggest_tutors():
+    def render():
+        tutors, _ = search_tutors(request.args.get('q', ''), prefix=True,
+                                  limit=app.config['SUGGESTIONS_LIMIT'])
+        return app.json.dumps([{'id': t.id, 'name': t.name, 'subject': t.subject} for t in tutors])
+
+    return cached_page(['tutors'], render, mimetype='application/json')
 
 @app.route('/tutor/<int:tutor_id>')
 def tutor_info(tutor_id):
-    tutor = Tutor.query.get_or_404(tutor_id)
-    return render_template('tutor_info.html', tutor=tutor)
+    def render():
+        tutor = Tutor.query.get_or_404(tutor_id)
+        return render_template('tutor_info.html', tutor=tutor)
+
+    return cached_page([f'tutor:{tutor_id}'], render)
 
 @app.route('/add_tutor', methods=['GET', 'POST'])
 def add_tutor():
@@ -64,6 +255,7 @@ def add_tutor():
                       available_slots=form.available_slots.data)
         db.session.add(tutor)
         db.session.commit()
+        page_cache.invalidate('tutors')
         flash('Tutor information added/updated successfully!', 'success')
         return redirect(url_for('home'))
     return render_template('add_tutor.html', form=form)
@@ -79,6 +271,7 @@ def edit_tutor(tutor_id):
         tutor.subject = form.subject.data
         tutor.available_slots = form.available_slots.data
         db.session.commit()
+        page_cache.invalidate('tutors', f'tutor:{tutor_id}')
         flash('Tutor information updated successfully!', 'success')
         return redirect(url_for('home'))
     
@@ -91,20 +284,27 @@ def book_slot(tutor_id):
 
     if form.validate_on_submit():
         selected_slot = form.slot.data.strip()
-        slots = [slot.strip() for slot in tutor.available_slots.split(',')]
-        
-        if selected_slot in slots:
-            # Remove the selected slot and create a booking
-            slots.remove(selected_slot)
-            tutor.available_slots = ', '.join(slots)
-            
-            booking = Booking(student_name=form.student_name.data, slot=selected_slot, tutor_id=tutor_id)
-            db.session.add(booking)
+        booking = Booking(student_name=form.student_name.data, slot=selected_slot, tutor_id=tutor_id)
+        db.session.add(booking)
+        db.session.flush()
+
+        # Claim the slot only if it is still free; a concurrent booking of the
+        # same slot matches no row and is rolled back
+        claimed = db.session.execute(
+            update(TutorSlot)
+            .where(TutorSlot.tutor_id == tutor_id, TutorSlot.start == selected_slot,
+                   TutorSlot.booking_id.is_(None))
+            .values(booking_id=booking.id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+        if claimed:
             db.session.commit()
-            
+            page_cache.invalidate(f'tutor:{tutor_id}')
             flash('Slot booked successfully!', 'success')
             return redirect(url_for('home'))
         else:
+            db.session.rollback()
             flash('Slot not available!', 'danger')
     
     return render_template('book_slot.html', tutor=tutor, form=form)
@@ -112,25 +312,38 @@ def book_slot(tutor_id):
 @app.route('/cancel/<int:booking_id>', methods=['POST'])
 def cancel_booking(booking_id):
     booking = Booking.query.get_or_404(booking_id)
-    tutor = Tutor.query.get(booking.tutor_id)
-    
-    # Add the slot back to available slots
-    slots = tutor.available_slots.split(',')
-    slots.append(booking.slot)
-    tutor.available_slots = ','.join(slots)
-    
+
+    # Free the slot again
+    db.session.execute(
+        update(TutorSlot)
+        .where(TutorSlot.booking_id == booking.id)
+        .values(booking_id=None)
+        .execution_options(synchronize_session=False)
+    )
     db.session.delete(booking)
     db.session.commit()
+    page_cache.invalidate(f'tutor:{booking.tutor_id}')
     
     flash('Booking canceled successfully!', 'success')
     return redirect(url_for('view_bookings'))
 
 @app.route('/bookings')
 def view_bookings():
-    bookings = Booking.query.all()
-    return render_template('view_bookings.html', bookings=bookings)
+    # The tutor is joined into the same SELECT, so a page costs one statement
+    query = Booking.query.options(joinedload(Booking.tutor))
+    tutor_id = request.args.get('tutor_id', type=int)
+    student_name = request.args.get('student', '').strip()
+    if tutor_id is not None:
+        query = query.filter(Booking.tutor_id == tutor_id)
+    if student_name:
+        query = query.filter(Booking.student_name == student_name)
+
+    bookings, next_cursor = keyset_page(query, Booking.id, request.args.get('after', type=int),
+                                        app.config['BOOKINGS_PER_PAGE'])
+    return render_template('view_bookings.html', bookings=bookings, next_cursor=next_cursor,
+                           tutor_id=tutor_id, student_name=student_name)
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        init_db()
     app.run(debug=True)
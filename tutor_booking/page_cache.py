@@ -0,0 +1,90 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class PageCache:
+    """LRU cache of rendered pages, each tagged with the data it shows.
+
+    Writers call ``invalidate`` with the tags they touched (e.g. ``tutor:3``)
+    and every page carrying one of them is dropped. A render that started
+    before such an invalidation is not stored, so a page built from data a
+    concurrent write just changed never makes it into the cache.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+        self._keys_by_tag = {}
+        # Clock value of each tag's last invalidation. Renders that started
+        # before _floor are never stored, which lets the dict be emptied
+        # once it holds more tags than there are cache entries.
+        self._clock = 0
+        self._invalidated = {}
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return ``(body, etag)`` for a cached page, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def snapshot(self, tags):
+        """Take before rendering, and pass to ``set`` with the result."""
+        with self._lock:
+            return self._clock, tuple(tags)
+
+    def set(self, key, body, snapshot):
+        """Cache ``body`` under ``key`` unless one of its tags was
+        invalidated since ``snapshot``. Returns ``(body, etag)`` either way."""
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        if len(body) > self.max_bytes:
+            return body, etag
+        started, tags = snapshot
+        with self._lock:
+            if started < self._floor or any(self._invalidated.get(tag, 0) > started for tag in tags):
+                return body, etag
+            self._discard(key)
+            self._entries[key] = (body, etag, tags)
+            self.size_bytes += len(body)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+        return body, etag
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._clock += 1
+            for tag in tags:
+                self._invalidated[tag] = self._clock
+                for key in self._keys_by_tag.pop(tag, ()):
+                    self._discard(key)
+            if len(self._invalidated) > self.max_entries:
+                self._invalidated.clear()
+                self._floor = self._clock
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self.size_bytes = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        body, _, tags = entry
+        self.size_bytes -= len(body)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
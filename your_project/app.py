@@ -1,51 +1,205 @@
-from flask import Flask, render_template, request, redirect, url_for
+import os
+from datetime import date, datetime, time, timedelta
+
+from flask import Flask, render_template, request, redirect, url_for, jsonify, abort
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from common.assets import Assets
+from common.metrics import Metrics
 
-app = Flask(__name__)
+# python -m your_project.app from the repository root; instance/ stays in this folder
+app = Flask(__name__, instance_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance'))
 
 # Configure the database URI
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///slots.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Largest window the slot listing reads at once, and the longest range and
+# most slots one "generate recurring slots" request may cover
+app.config['MAX_WINDOW_DAYS'] = 31
+app.config['MAX_GENERATED_DAYS'] = 366
+app.config['MAX_GENERATED_SLOTS'] = 20000
+# Any of the above can be overridden with FLASK_<NAME> environment variables
+app.config.from_prefixed_env()
 
 # Initialize the database
 db = SQLAlchemy(app)
+metrics = Metrics(app, db)
+assets = Assets(app)
 
 # Define the Slot model
 class Slot(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    time = db.Column(db.String(120), unique=True, nullable=False)
+    time = db.Column(db.DateTime, unique=True, index=True, nullable=False)
     status = db.Column(db.String(10), nullable=True)  # None, "Booked"
 
+    def to_dict(self):
+        return {'id': self.id, 'time': self.time.isoformat(), 'status': self.status}
+
+LEGACY_TIME_FORMATS = ['%Y-%m-%d %H:%M', '%d/%m/%Y %H:%M', '%d-%m-%Y %H:%M']
+
+def parse_legacy_time(value):
+    try:
+        return datetime.fromisoformat(value.strip())
+    except ValueError:
+        pass
+    for fmt in LEGACY_TIME_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            pass
+    return None
+
+def migrate_slot_times():
+    """Convert slot.time from free-form text to an indexed DATETIME.
+
+    Rows whose text cannot be read as a date and time are left in the
+    slot_legacy table instead of being dropped.
+    """
+    columns = {c['name']: c['type'] for c in inspect(db.engine).get_columns('slot')}
+    if isinstance(columns['time'], db.DateTime):
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text('ALTER TABLE slot RENAME TO slot_legacy'))
+        Slot.__table__.create(conn)
+        for index in Slot.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        rows = conn.execute(text('SELECT id, time, status FROM slot_legacy')).fetchall()
+        converted = [(row.id, parse_legacy_time(row.time), row.status) for row in rows]
+        converted = [row for row in converted if row[1] is not None]
+        if converted:
+            conn.execute(sqlite_insert(Slot).on_conflict_do_nothing(),
+                         [{'id': id, 'time': when, 'status': status} for id, when, status in converted])
+            conn.execute(text('DELETE FROM slot_legacy WHERE id IN (SELECT id FROM slot)'))
+        if len(converted) == len(rows):
+            conn.execute(text('DROP TABLE slot_legacy'))
+        else:
+            app.logger.warning('%d slots could not be converted and were kept in slot_legacy',
+                               len(rows) - len(converted))
+
 # Create the database tables
 with app.app_context():
     db.create_all()
+    migrate_slot_times()
+
+def slots_between(start, end):
+    return Slot.query.filter(Slot.time >= start, Slot.time < end).order_by(Slot.time).all()
+
+def parse_window():
+    """Read the ``start`` date and ``days`` of the requested window."""
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else date.today()
+    except ValueError:
+        abort(400)
+    days = min(max(request.args.get('days', 7, type=int), 1), app.config['MAX_WINDOW_DAYS'])
+    # Keep the previous and next windows inside the range of dates
+    start = min(max(start, date.min + timedelta(days=days)), date.max - timedelta(days=days))
+    return start, days
+
+def parse_local_datetime(value):
+    """Parse an ISO 8601 datetime; slot times are naive local times, so
+    one with a UTC offset is rejected like any other invalid value."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        raise ValueError('slot times have no time zone')
+    return parsed
+
+def insert_slots(times):
+    """Insert one free slot per datetime in a single transaction, skipping
+    times that already have a slot. Returns how many were created."""
+    if not times:
+        return 0
+    result = db.session.connection().execute(
+        sqlite_insert(Slot).on_conflict_do_nothing(index_elements=['time']),
+        [{'time': when, 'status': None} for when in times],
+    )
+    db.session.commit()
+    return result.rowcount
+
+def recurring_times(start, end, weekdays, times_of_day):
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        if day.weekday() in weekdays:
+            for time_of_day in times_of_day:
+                yield datetime.combine(day, time_of_day)
 
 @app.route('/')
 def index():
-    slots = Slot.query.all()
-    return render_template('index.html', slots=slots)
+    start, days = parse_window()
+    begin = datetime.combine(start, time())
+    slots = slots_between(begin, begin + timedelta(days=days))
+    return render_template('index.html', slots=slots, start=start, days=days,
+                           previous_start=start - timedelta(days=days),
+                           next_start=start + timedelta(days=days))
+
+@app.route('/api/slots')
+def list_slots():
+    try:
+        start = parse_local_datetime(request.args['from'])
+        end = parse_local_datetime(request.args['to'])
+    except (KeyError, ValueError):
+        return jsonify(error="'from' and 'to' must be ISO 8601 datetimes without a time zone"), 400
+    if end - start > timedelta(days=app.config['MAX_WINDOW_DAYS']):
+        return jsonify(error=f"Window is limited to {app.config['MAX_WINDOW_DAYS']} days"), 400
+    return jsonify([slot.to_dict() for slot in slots_between(start, end)])
 
 @app.route('/create', methods=['GET', 'POST'])
 def create_slot():
     if request.method == 'POST':
         slot_time = request.form.get('slot_time')
         if slot_time:
-            existing_slot = Slot.query.filter_by(time=slot_time).first()
-            if existing_slot is None:
-                new_slot = Slot(time=slot_time, status=None)
-                db.session.add(new_slot)
-                db.session.commit()
+            try:
+                insert_slots([parse_local_datetime(slot_time)])
+            except ValueError:
+                abort(400)
         return redirect(url_for('index'))
     return render_template('create.html')
 
+@app.route('/generate', methods=['GET', 'POST'])
+def generate_slots():
+    if request.method == 'POST':
+        try:
+            start = date.fromisoformat(request.form['start_date'])
+            end = date.fromisoformat(request.form['end_date'])
+            times_of_day = [time.fromisoformat(t.strip())
+                            for t in request.form['times'].split(',') if t.strip()]
+            weekdays = {int(day) for day in request.form.getlist('weekdays')}
+            if (not times_of_day or not weekdays or end < start
+                    or any(t.tzinfo is not None for t in times_of_day) or not weekdays <= set(range(7))):
+                raise ValueError
+        except (KeyError, ValueError):
+            return render_template('generate.html', error='Please enter valid dates and times.'), 400
+        if (end - start).days >= app.config['MAX_GENERATED_DAYS']:
+            return render_template('generate.html', error=(
+                f"Slots can be generated for at most {app.config['MAX_GENERATED_DAYS']} days at once.")), 400
+
+        times = []
+        for when in recurring_times(start, end, weekdays, times_of_day):
+            if len(times) == app.config['MAX_GENERATED_SLOTS']:
+                return render_template('generate.html', error=(
+                    f"At most {app.config['MAX_GENERATED_SLOTS']} slots can be generated at once.")), 400
+            times.append(when)
+        created = insert_slots(times)
+        return render_template('generate.html', created=created, skipped=len(times) - created)
+    return render_template('generate.html')
+
 @app.route('/book/<int:slot_id>', methods=['GET', 'POST'])
 def book(slot_id):
-    slot = Slot.query.get_or_404(slot_id)
     if request.method == 'POST':
-        if slot.status is None:
-            slot.status = "Booked"
-            db.session.commit()
+        # Compare-and-set: only a free slot becomes booked, so racing
+        # requests cannot both take it
+        booked = db.session.execute(
+            update(Slot)
+            .where(Slot.id == slot_id, Slot.status.is_(None))
+            .values(status="Booked")
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if not booked:
+            Slot.query.get_or_404(slot_id)
         return redirect(url_for('index'))
+    slot = Slot.query.get_or_404(slot_id)
     return render_template('book.html', slot=slot)
 
 if __name__ == '__main__':